@@ -0,0 +1,4 @@
+"""
+Package: benchmarks
+Load tests and benchmarks for the Wishlists REST API
+"""
@@ -0,0 +1,128 @@
+"""
+Startup Benchmark
+
+Measures how long a fresh Python process takes to import and create the
+service app and to answer its first request, which is what a new gunicorn worker
+pays on every cold start, scale-up and rolling deploy. Every sample
+runs in its own interpreter so nothing is cached between them, and
+counts the database connections opened while importing, which should
+be none now that the tables are created by `flask db-upgrade`.
+
+Usage:
+    python -m benchmarks.startup --runs 20
+    python -m benchmarks.startup --compare startup_results.json
+
+The database named by --database-uri (or DATABASE_URI) is only read;
+it defaults to a local SQLite file.
+"""
+import os
+import sys
+import json
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+from benchmarks.run import DEFAULT_DATABASE_URI, git_commit
+
+OUTPUT_FILE = "startup_results.json"
+
+# runs in a fresh interpreter and prints one JSON sample
+PROBE = """
+import json, time
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connects = []
+event.listen(Pool, "connect", lambda *args: connects.append(1))
+from service import create_app
+app = create_app()
+imported = time.perf_counter()
+import_connects = len(connects)
+response = app.test_client().get("/health")
+first_request = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first_request - imported) * 1000,
+    "import_connects": import_connects,
+    "status": response.status_code,
+}))
+"""
+
+MEASURES = ("import_ms", "first_request_ms", "total_ms")
+
+
+def sample(database_uri):
+    """Starts one interpreter and returns its timings"""
+    env = dict(os.environ, DATABASE_URI=database_uri)
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    output = subprocess.check_output([sys.executable, "-c", PROBE], env=env, text=True,
+                                     stderr=subprocess.DEVNULL)
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total_ms"] = result["import_ms"] + result["first_request_ms"]
+    return result
+
+
+def summarize(samples):
+    """Returns the median, minimum and maximum of every measure"""
+    results = {}
+    for measure in MEASURES:
+        values = [one[measure] for one in samples]
+        results[measure] = {
+            "median": round(statistics.median(values), 3),
+            "min": round(min(values), 3),
+            "max": round(max(values), 3),
+        }
+    results["import_connects"] = max(one["import_connects"] for one in samples)
+    results["errors"] = sum(1 for one in samples if one["status"] != 200)
+    return results
+
+
+def compare(baseline, current):
+    """Prints the change of the median timings against a previous run"""
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta']['timestamp']}):")
+    for measure in MEASURES:
+        old, new = baseline[measure]["median"], current[measure]["median"]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{measure:<20}{old:>10.1f}{new:>10.1f}{change:>10}")
+
+
+def parse_args(argv):
+    """Parses the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-uri", default=os.getenv("DATABASE_URI", DEFAULT_DATABASE_URI))
+    parser.add_argument("--runs", type=int, default=10, help="fresh processes to start")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of a previous run to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Starts the service in fresh processes and writes the results"""
+    args = parse_args(argv)
+    print(f"Starting the service {args.runs} times...")
+    results = summarize([sample(args.database_uri) for _ in range(args.runs)])
+    results["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "database_uri": args.database_uri.split("@")[-1],
+        "python": platform.python_version(),
+        "runs": args.runs,
+    }
+
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, indent=2)
+    print(f"import {results['import_ms']['median']}ms, first request {results['first_request_ms']['median']}ms, "
+          f"total {results['total_ms']['median']}ms (median), "
+          f"{results['import_connects']} database connections while importing")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline:
+            compare(json.load(baseline), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Gunicorn configuration
+
+Loaded automatically by gunicorn from the working directory. Every
+setting can be overridden with the environment variable named next to
+it, and command line options override both.
+
+GUNICORN_WORKER_CLASS selects how each worker serves requests:
+  sync   - one request at a time per thread (default); with more
+           than one thread gunicorn uses threaded (gthread) workers
+  gevent - many concurrent requests per worker on greenlets; psycopg2 is
+           made cooperative with psycogreen, so a request waiting on
+           PostgreSQL no longer blocks the whole worker
+
+The number of workers and threads is sized from the CPUs the container
+may actually use, which is the cgroup CPU quota when there is one rather
+than the number of CPUs on the node.
+"""
+import os
+import glob
+import math
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    return value.lower() in ("true", "1", "yes") if value else default
+
+
+def available_cpus(cgroup_root=CGROUP_ROOT):
+    """Returns the number of CPUs this process may use, rounded up
+
+    Takes the smallest of the CPUs it is scheduled on and the cgroup
+    (v2 or v1) CPU quota, so a pod limited to 1.5 CPUs on a 64 core node
+    counts 2 CPUs.
+    """
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = _cgroup_quota(cgroup_root)
+    if quota:
+        count = min(count, math.ceil(quota))
+    return max(1, count)
+
+
+def _cgroup_quota(cgroup_root):
+    """Returns the CPU quota in CPUs, or None when it is unlimited or unknown"""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open(os.path.join(cgroup_root, "cpu.max"), encoding="utf-8") as cpu_max:
+            quota, period = cpu_max.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means unlimited
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us"), encoding="utf-8") as quota_file:
+            quota = int(quota_file.read())
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us"), encoding="utf-8") as period_file:
+            period = int(period_file.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+######################################################################
+#  S E T T I N G S
+######################################################################
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8080')}")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+# maximum concurrent requests per gevent worker
+worker_connections = _env_int("GUNICORN_WORKER_CONNECTIONS", 1000)
+
+# sync workers block on every request, so run two per CPU (plus one to
+# cover a worker stuck in I/O); a gevent worker already keeps its CPU busy
+cpus = available_cpus()
+workers = _env_int("GUNICORN_WORKERS", 2 * cpus + 1 if worker_class == "sync" else cpus)
+# sync workers also get a thread per CPU, up to the size of their database
+# pool so every thread can hold a connection; gevent workers ignore threads
+threads = _env_int("GUNICORN_THREADS", min(cpus, _env_int("DB_POOL_SIZE", 5)) if worker_class == "sync" else 1)
+
+# Load the app once in the master and fork the workers from it: faster
+# starts and shared memory pages. Off by default for gevent, which has to
+# monkey patch the standard library before the app is imported.
+preload_app = _env_bool("GUNICORN_PRELOAD", worker_class != "gevent")
+
+# longer than the idle timeout of the load balancer in front, so it never
+# sends a request on a connection gunicorn is closing
+keepalive = _env_int("GUNICORN_KEEPALIVE", 75)
+backlog = _env_int("GUNICORN_BACKLOG", 2048)
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# recycle workers now and then to bound memory growth; the jitter keeps
+# them from all restarting at the same moment. With PROMETHEUS_MULTIPROC_DIR
+# every recycled worker leaves its counter files behind (child_exit only
+# drops its live gauges) until the server restarts, see on_starting
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+######################################################################
+#  S E R V E R   H O O K S
+######################################################################
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """Removes metric samples left over from a previous run of the server"""
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Prepares a freshly forked worker
+
+    With preload_app the master may already hold pooled database
+    connections; the worker drops its copies of them without closing the
+    sockets the master still owns, and opens its own on first use.
+    """
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg  # pylint: disable=import-outside-toplevel
+        patch_psycopg()
+    # the app create_app() returned in the master, when it was preloaded
+    app = getattr(worker.app, "callable", None)
+    if preload_app and app is not None:
+        from service.models import db  # pylint: disable=import-outside-toplevel
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Drops the live gauges of a worker that exited from /metrics"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess  # pylint: disable=import-outside-toplevel
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,24 +1,24 @@
 """
 Package: service
 Package for the application models and service routes
-This module creates and configures the Flask app and sets up the logging
-and SQL database
+This module contains the create_app() factory that creates and configures
+a Flask app with its routes, logging and SQL database
 """
 import sys
-from flask import Flask
+from flask import Blueprint, Flask
 from flask_restx import Api
-from service import config
+from service import config as service_config
 from service.common import log_handlers
 
-# Create Flask application
-app = Flask(__name__)
-app.config.from_object(config)
-app.url_map.strict_slashes = False
+# Every app made by create_app() registers this blueprint. The routes,
+# error handlers and CLI commands are bound to it rather than to an app,
+# so more than one app can exist in a process.
+blueprint = Blueprint("wishlists", __name__, cli_group=None)
 
 ######################################################################
 # Configure Swagger before initializing it
 ######################################################################
-api = Api(app,
+api = Api(blueprint,
           version='1.0.0',
           title='Wishlist Demo REST API Service',
           description='This is Wishlists microservice for an e-commerce app.',
@@ -28,24 +28,53 @@ api = Api(app,
           prefix='/api',
           )
 
-# Dependencies require we import the routes AFTER the Flask app is created
+# Dependencies require we import the routes AFTER the blueprint is created
 # pylint: disable=wrong-import-position, wrong-import-order, cyclic-import
-from service import routes, models  # noqa: E402, E261
+from service import routes, models  # noqa: E402, E261, F401
 # pylint: disable=wrong-import-position
-from service.common import error_handlers, cli_commands  # noqa: F401, E402
+from service.common import error_handlers, cli_commands, metrics, query_profiler, cpu_profiler  # noqa: F401, E402
 
-# Set up logging for production
-log_handlers.init_logging(app, "gunicorn.error")
 
-app.logger.info(70 * "*")
-app.logger.info("  S E R V I C E   R U N N I N G  ".center(70, "*"))
-app.logger.info(70 * "*")
+def create_app(config=None) -> Flask:
+    """
+    Creates and configures a Flask app for the service
 
-try:
-    models.init_db(app)  # make our SQLAlchemy tables
-except Exception as error:  # pylint: disable=broad-except
-    app.logger.critical("%s: Cannot continue", error)
-    # gunicorn requires exit code 4 to stop spawning workers when they die
-    sys.exit(4)
+    Args:
+        config (dict): settings that override the ones in service.config,
+            e.g. {"SQLALCHEMY_DATABASE_URI": ...} for a test database
 
-app.logger.info("Service initialized!")
+    The app does not connect to the database until it serves a request;
+    the tables are created by `flask db-upgrade`.
+    """
+    app = Flask(__name__)
+    app.config.from_object(service_config)
+    app.config.update(config or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", service_config.engine_options(app.config))
+    app.url_map.strict_slashes = False
+    app.register_blueprint(blueprint)
+
+    # Collect request and database metrics for /metrics
+    metrics.init_metrics(app)
+
+    # Profile the SQL statements of each request when QUERY_PROFILER is set
+    query_profiler.init_query_profiler(app)
+
+    # Admin-only CPU profiling when PROFILING_ENABLED is set
+    cpu_profiler.init_cpu_profiler(app)
+
+    # Set up logging for production
+    log_handlers.init_logging(app, "gunicorn.error")
+
+    app.logger.info(70 * "*")
+    app.logger.info("  S E R V I C E   R U N N I N G  ".center(70, "*"))
+    app.logger.info(70 * "*")
+
+    try:
+        models.init_db(app)  # the tables are created by `flask db-upgrade`
+    except Exception as error:  # pylint: disable=broad-except
+        app.logger.critical("%s: Cannot continue", error)
+        # gunicorn requires exit code 4 to stop spawning workers when they die
+        sys.exit(4)
+
+    app.logger.info("Service initialized!")
+    return app
@@ -0,0 +1,38 @@
+"""
+Admin Authorization
+
+The /admin endpoints expose the internals of a worker, so they are only
+served when an ADMIN_TOKEN is configured, and only to callers that send
+it in an "Authorization: Bearer <token>" header.
+"""
+import hmac
+from functools import wraps
+from flask import current_app, jsonify, request
+from service.common import status
+
+
+def admin_error():
+    """Returns (status, message) unless an admin token is configured and the caller sent it"""
+    token = current_app.config.get("ADMIN_TOKEN")
+    if not token:
+        return status.HTTP_404_NOT_FOUND, "Admin endpoints are not enabled."
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+        return status.HTTP_403_FORBIDDEN, "This endpoint requires the admin token."
+    return None
+
+
+def admin_only(view):
+    """Decorates a view so only admins can call it"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        denied = admin_error()
+        if denied:
+            return error_response(*denied)
+        return view(*args, **kwargs)
+    return guarded
+
+
+def error_response(code: int, message: str):
+    """Logs a refused admin request and returns its JSON error response"""
+    current_app.logger.warning(message)
+    return jsonify(status_code=code, message=message), code
@@ -0,0 +1,279 @@
+"""
+Bulk Import
+
+Loads wishlists and items from NDJSON or CSV files straight into the
+tables. Every record is checked with Wishlist.deserialize or
+Item.deserialize first, and then against the database: ids that are
+already taken and items whose wishlist does not exist are rejected too.
+Records that fail are counted and reported instead of stopping the load.
+The rows that pass are written in batches, with COPY on PostgreSQL and
+with multi-row INSERT statements on other databases such as SQLite.
+Existing wishlists that receive items get a new version, like any other
+change to their items.
+
+NDJSON files hold one record per line, in the format written by
+`flask wishlists-export`, so wishlists may embed their items. CSV files
+hold either wishlists or items, one per row, with a header naming the
+columns.
+"""
+import io
+import csv
+import json
+import time
+import logging
+import datetime
+from itertools import islice
+from service.models import db, Wishlist, Item, DataValidationError
+
+logger = logging.getLogger("flask.app")
+
+WISHLIST_COLUMNS = ("id", "name", "owner_id", "created_at", "version")
+ITEM_COLUMNS = ("id", "wishlist_id", "product_id", "item_quantity", "product_name")
+
+# CSV values are text; these fields are converted to integers before validation
+INTEGER_FIELDS = ("id", "owner_id", "wishlist_id", "product_id", "item_quantity")
+
+# the bind parameter limit of older SQLite builds
+SQLITE_MAX_VARIABLES = 999
+
+
+class ImportStats:
+    """Counts the rows loaded and the records rejected by an import"""
+
+    def __init__(self):
+        self.wishlists = 0
+        self.items = 0
+        self.rejected = []
+        self.seconds = 0.0
+
+    @property
+    def rows(self):
+        """The number of rows written to the database"""
+        return self.wishlists + self.items
+
+    @property
+    def rows_per_second(self):
+        """The load rate in rows per second"""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def reject(self, line, error, record):
+        """Records a record that failed validation"""
+        logger.debug("Rejected line %s: %s", line, error)
+        self.rejected.append({"line": line, "error": str(error), "record": record})
+
+
+######################################################################
+#  R E A D E R S
+######################################################################
+
+
+def read_ndjson(stream):
+    """Yields (line number, record) for each line of an NDJSON file
+
+    Lines that are not valid JSON are yielded as their text so that they
+    are rejected along with the records that fail validation.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, line.rstrip("\n")
+
+
+def read_csv(stream):
+    """Yields (line number, record) for each row of a CSV file with a header"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {key: value for key, value in row.items() if value not in (None, "")}
+        for field in INTEGER_FIELDS:
+            value = record.get(field)
+            if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+                record[field] = int(value)
+        yield reader.line_num, record
+
+
+######################################################################
+#  V A L I D A T I O N
+######################################################################
+
+
+def wishlist_rows(record):
+    """Validates a wishlist record
+
+    Returns:
+        the wishlist row and the rows of the items embedded in it
+    """
+    if not isinstance(record, dict):
+        raise DataValidationError("Invalid Wishlist: not a JSON object")
+    if not isinstance(record.get("id"), int):
+        raise DataValidationError("Invalid Wishlist: missing id")
+    items = record.get("wishlist_items") or []
+    if not isinstance(items, list):
+        raise DataValidationError("Invalid Wishlist: wishlist_items is not a list")
+    for item in items:
+        if isinstance(item, dict):
+            item.setdefault("wishlist_id", record["id"])
+    wishlist = Wishlist().deserialize(record)
+    row = (record["id"], wishlist.name, wishlist.owner_id, _parse_timestamp(record.get("created_at")), 1)
+    return row, [_item_row(item) for item in wishlist.wishlist_items]
+
+
+def item_row(record):
+    """Validates an item record and returns its row"""
+    if not isinstance(record, dict):
+        raise DataValidationError("Invalid Item: not a JSON object")
+    return _item_row(Item().deserialize(record))
+
+
+def _item_row(item):
+    return (item.id, item.wishlist_id, item.product_id, item.item_quantity, item.product_name)
+
+
+def _parse_timestamp(value):
+    if value is None:
+        return datetime.datetime.now()
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError) as error:
+        raise DataValidationError(f"Invalid Wishlist: bad created_at {value!r}") from error
+
+
+######################################################################
+#  L O A D I N G
+######################################################################
+
+
+def import_records(records, kind="wishlists", batch_size=1000):
+    """Validates and loads records into the database in one transaction
+
+    Args:
+        records: (line number, record) pairs from read_ndjson or read_csv
+        kind (str): "wishlists" or "items"
+        batch_size (int): the number of records written at a time
+
+    Returns:
+        an ImportStats with the rows loaded and the records rejected
+    """
+    stats = ImportStats()
+    start = time.perf_counter()
+    records = iter(records)
+    touched = set()
+    with db.engine.begin() as conn:
+        write_rows = _copy_rows if conn.dialect.name == "postgresql" else _insert_rows
+        batch = list(islice(records, batch_size))
+        while batch:
+            wishlists, items = _valid_rows(conn, kind, batch, stats)
+            # wishlists first so the items of this batch find their parent
+            write_rows(conn, Wishlist.__table__, WISHLIST_COLUMNS, wishlists)
+            write_rows(conn, Item.__table__, ITEM_COLUMNS, items)
+            changed = {item[1] for item in items} - {wishlist[0] for wishlist in wishlists}
+            _touch(conn, changed)
+            touched |= changed
+            stats.wishlists += len(wishlists)
+            stats.items += len(items)
+            batch = list(islice(records, batch_size))
+        if conn.dialect.name == "postgresql":
+            _reset_sequences(conn)
+    Wishlist.invalidate(*touched)
+    stats.seconds = time.perf_counter() - start
+    logger.info("Imported %s wishlists and %s items, rejected %s", stats.wishlists, stats.items, len(stats.rejected))
+    return stats
+
+
+def _valid_rows(conn, kind, batch, stats):
+    """Returns the wishlist and item rows of the records in a batch that can be loaded"""
+    candidates = []
+    for line, record in batch:
+        try:
+            if kind == "wishlists":
+                candidates.append((line, record, *wishlist_rows(record)))
+            else:
+                candidates.append((line, record, None, [item_row(record)]))
+        except DataValidationError as error:
+            stats.reject(line, error, record)
+    item_rows = [item for *_, items in candidates for item in items]
+    taken_wishlists = _existing_ids(conn, Wishlist.__table__, [row[0] for _, _, row, _ in candidates if row])
+    taken_items = _existing_ids(conn, Item.__table__, [item[0] for item in item_rows])
+    parents = _existing_ids(conn, Wishlist.__table__, [item[1] for item in item_rows])
+    wishlists, items = [], []
+    for line, record, row, record_items in candidates:
+        try:
+            _check_ids(row, record_items, taken_wishlists, taken_items, parents)
+        except DataValidationError as error:
+            stats.reject(line, error, record)
+            continue
+        if row:
+            wishlists.append(row)
+            taken_wishlists.add(row[0])
+            parents.add(row[0])
+        items.extend(record_items)
+        taken_items.update(item[0] for item in record_items)
+    return wishlists, items
+
+
+def _check_ids(row, item_rows, taken_wishlists, taken_items, parents):
+    """Raises DataValidationError if a record's ids are taken or its items have no wishlist"""
+    if row and row[0] in taken_wishlists:
+        raise DataValidationError(f"Invalid Wishlist: id {row[0]} already exists")
+    item_ids = [item[0] for item in item_rows]
+    for item in item_rows:
+        if item[0] in taken_items or item_ids.count(item[0]) > 1:
+            raise DataValidationError(f"Invalid Item: id {item[0]} already exists")
+        if item[1] not in parents and not (row and item[1] == row[0]):
+            raise DataValidationError(f"Invalid Item: wishlist {item[1]} does not exist")
+
+
+def _existing_ids(conn, table, ids):
+    """Returns which of the ids are already in the table"""
+    ids = list(set(ids))
+    found = set()
+    for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+        query = db.select(table.c.id).where(table.c.id.in_(ids[start:start + SQLITE_MAX_VARIABLES]))
+        found.update(conn.execute(query).scalars())
+    return found
+
+
+def _touch(conn, wishlist_ids):
+    """Bumps the version of existing wishlists that received items, like Wishlist.touch"""
+    table = Wishlist.__table__
+    wishlist_ids = sorted(wishlist_ids)
+    now = datetime.datetime.now()
+    for start in range(0, len(wishlist_ids), SQLITE_MAX_VARIABLES):
+        conn.execute(
+            table.update()
+            .where(table.c.id.in_(wishlist_ids[start:start + SQLITE_MAX_VARIABLES]))
+            .values(version=table.c.version + 1, updated_at=now)
+        )
+
+
+def _copy_rows(conn, table, columns, rows):
+    """Streams the rows into the table with COPY ... FROM STDIN"""
+    if not rows:
+        return
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_rows(conn, table, columns, rows):
+    """Writes the rows with as few multi-row INSERT statements as possible"""
+    per_statement = max(1, SQLITE_MAX_VARIABLES // len(columns))
+    for start in range(0, len(rows), per_statement):
+        values = [dict(zip(columns, row)) for row in rows[start:start + per_statement]]
+        conn.execute(table.insert().values(values))
+
+
+def _reset_sequences(conn):
+    """Moves the id sequences past the ids that were loaded"""
+    for table in (Wishlist.__table__, Item.__table__):
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+        )
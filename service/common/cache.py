@@ -0,0 +1,125 @@
+"""
+Cache
+
+This module contains the read-through cache used for single Wishlist
+reads. Cache defines the interface, so a shared cache (e.g. Redis or
+memcached) can be dropped in by implementing the same methods.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+class Cache:
+    """Interface for a key/value cache with hit/miss/eviction counters"""
+
+    def get(self, key):
+        """Returns the cached value for key or None on a miss"""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        """Stores value under key"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Removes key from the cache if it is present"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes every entry from the cache"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Returns the cache counters"""
+        raise NotImplementedError
+
+
+class NullCache(Cache):
+    """A cache that never stores anything, used when caching is disabled"""
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "null", "size": 0, "max_size": 0, "hits": 0,
+                "misses": self.misses, "evictions": 0, "expirations": 0}
+
+
+class LRUCache(Cache):
+    """
+    In-process least recently used cache with a time to live
+
+    Entries older than ttl seconds are treated as misses, and the least
+    recently used entry is evicted once max_size is reached. The cache is
+    local to one worker process, so the ttl bounds how stale a read can be
+    after a write handled by another worker.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 5.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "lru", "size": len(self._data), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "expirations": self.expirations}
+
+
+def make_cache(max_size: int, ttl: float) -> Cache:
+    """Returns an LRUCache, or a NullCache when max_size is 0"""
+    if max_size <= 0:
+        return NullCache()
+    return LRUCache(max_size=max_size, ttl=ttl)
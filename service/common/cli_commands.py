@@ -1,8 +1,12 @@
 """
 Flask CLI Command Extensions
 """
-from service import app
-from service.models import db
+import click
+from service import blueprint
+from service.models import db, Wishlist
+from service import migrations
+from service.common import bulk_import
+from service.common.ndjson import dumps_lines
 
 
 ######################################################################
@@ -10,7 +14,7 @@ from service.models import db
 # Usage:
 #   flask db-create
 ######################################################################
-@app.cli.command("db-create")
+@blueprint.cli.command("db-create")
 def db_create():
     """
     Recreates a local database. You probably should not use this on
@@ -19,3 +23,76 @@ def db_create():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    with db.engine.begin() as conn:
+        migrations.stamp(conn)
+
+
+######################################################################
+# Command to apply pending schema migrations
+# Usage:
+#   flask db-upgrade
+######################################################################
+@blueprint.cli.command("db-upgrade")
+def db_upgrade():
+    """
+    Creates the tables or brings an existing database up to the current
+    schema version. Safe to run on every deploy.
+    """
+    applied = migrations.upgrade()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+    click.echo(f"Database is at schema version {migrations.head_version()}")
+
+
+######################################################################
+# Command to export all wishlists as newline delimited JSON
+# Usage:
+#   flask wishlists-export [--output FILE] [--chunk-size N]
+######################################################################
+@blueprint.cli.command("wishlists-export")
+@click.option("--output", "-o", type=click.File("w"), default="-", help="File to write to (default stdout)")
+@click.option("--chunk-size", default=1000, show_default=True, help="Wishlists read from the database at a time")
+def wishlists_export(output, chunk_size):
+    """
+    Writes every wishlist with its items as one JSON document per line,
+    using constant memory.
+    """
+    count = 0
+    for chunk in Wishlist.export_chunks(chunk_size):
+        output.write(dumps_lines(chunk))
+        count += len(chunk)
+    click.echo(f"Exported {count} wishlists", err=True)
+
+
+######################################################################
+# Command to bulk load wishlists or items from NDJSON or CSV
+# Usage:
+#   flask wishlists-import FILE [--format ndjson|csv] [--kind wishlists|items]
+######################################################################
+@blueprint.cli.command("wishlists-import")
+@click.argument("source", type=click.File("r"))
+@click.option("--format", "file_format", type=click.Choice(["ndjson", "csv"]),
+              help="Input format (default from the file extension, else ndjson)")
+@click.option("--kind", type=click.Choice(["wishlists", "items"]), default="wishlists", show_default=True,
+              help="What each record holds")
+@click.option("--batch-size", default=1000, show_default=True, help="Records written to the database at a time")
+@click.option("--rejects", type=click.File("w"), help="Write rejected records here as NDJSON")
+def wishlists_import(source, file_format, kind, batch_size, rejects):
+    """
+    Loads wishlists and their items, or items alone, from SOURCE. Records
+    are validated like API requests; rejected ones are reported and
+    skipped. Uses COPY on PostgreSQL and batched INSERTs on SQLite.
+    """
+    if file_format is None:
+        file_format = "csv" if source.name.lower().endswith(".csv") else "ndjson"
+    reader = bulk_import.read_csv if file_format == "csv" else bulk_import.read_ndjson
+    stats = bulk_import.import_records(reader(source), kind=kind, batch_size=batch_size)
+    if rejects is not None:
+        rejects.write(dumps_lines(stats.rejected))
+    else:
+        for rejected in stats.rejected:
+            click.echo(f"Rejected line {rejected['line']}: {rejected['error']}", err=True)
+    click.echo(
+        f"Imported {stats.wishlists} wishlists and {stats.items} items in {stats.seconds:.2f}s "
+        f"({stats.rows_per_second:,.0f} rows/sec), rejected {len(stats.rejected)} records"
+    )
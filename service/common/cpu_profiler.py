@@ -0,0 +1,173 @@
+"""
+CPU Profiler
+
+Admin-only profiling of a live worker, enabled with PROFILING_ENABLED and
+authorized with the ADMIN_TOKEN bearer token. Both are off by default.
+
+GET /admin/profile?seconds=10&interval_ms=10
+    Samples the Python stack of every thread of the worker for the given
+    time and returns them in the collapsed stack format that flamegraph.pl
+    and speedscope read: one "frame;frame;frame count" line per stack.
+    The sampler runs in its own OS thread, so it also sees the greenlets
+    of a gevent worker. A sync worker serves one request at a time, so
+    there it only sees background threads; profile a single request
+    instead.
+
+X-Profile: <sort key>
+    Runs one request under cProfile and returns its stats as text in
+    place of the normal response, sorted by the header value (cumulative
+    by default). The original status is in X-Profiled-Status. This covers
+    the Flask and flask-restx dispatch, the serializers and the models.
+"""
+import io
+import sys
+import time
+import pstats
+import cProfile
+from collections import Counter
+from flask import Response, current_app, g, request
+from service.common import status
+from service.common.admin import admin_error, error_response
+
+# cProfile functions listed per profiled request
+PROFILE_STATS_LIMIT = 60
+SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls", "time")
+# headers describing the original body, which the profiled response replaces
+BODY_HEADERS = ("content-type", "content-length", "content-encoding", "content-range", "content-disposition")
+# seconds kept free between the longest sample and the worker timeout
+WORKER_TIMEOUT_MARGIN = 5
+
+
+def init_cpu_profiler(app):
+    """Adds the /admin/profile endpoint and the X-Profile request header to the app"""
+    app.add_url_rule("/admin/profile", "cpu_profile", cpu_profile)
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+
+
+def cpu_profile():
+    """Samples the stacks of the worker for a while and returns them collapsed"""
+    denied = _profiling_error()
+    if denied:
+        return error_response(*denied)
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval = float(request.args.get("interval_ms", 10)) / 1000
+    except ValueError:
+        return error_response(status.HTTP_400_BAD_REQUEST, "seconds and interval_ms must be numbers")
+    max_seconds = max_profile_seconds()
+    if not 0 < seconds <= max_seconds or not 0.001 <= interval <= 1:
+        return error_response(status.HTTP_400_BAD_REQUEST,
+                              f"seconds must be in (0, {max_seconds:g}] and interval_ms in [1, 1000]")
+    current_app.logger.info("Sampling worker stacks for %s seconds every %s ms", seconds, interval * 1000)
+    stacks = sample_stacks(seconds, interval)
+    body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    return Response(body, mimetype="text/plain")
+
+
+def max_profile_seconds() -> float:
+    """Returns the longest sample allowed, PROFILE_MAX_SECONDS capped below the worker timeout"""
+    max_seconds = current_app.config["PROFILE_MAX_SECONDS"]
+    timeout = current_app.config.get("WORKER_TIMEOUT")
+    if timeout:
+        max_seconds = min(max_seconds, max(timeout - WORKER_TIMEOUT_MARGIN, timeout / 2))
+    return max_seconds
+
+
+######################################################################
+#  S T A C K   S A M P L I N G
+######################################################################
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """Returns how often each collapsed stack was seen over the given time
+
+    The sampler runs in a real OS thread even under gevent, and the thread
+    serving this request is left out unless its greenlets share it.
+    """
+    start_new_thread = _original("_thread", "start_new_thread")
+    get_ident = _original("_thread", "get_ident")
+    sleep = _original("time", "sleep")
+    requester = None if _gevent_patched() else get_ident()
+    stacks = Counter()
+    done = []
+
+    def sample():
+        sampler = get_ident()
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                    if thread_id not in (sampler, requester):
+                        stacks[collapse(frame)] += 1
+                sleep(interval)
+        finally:
+            done.append(True)
+
+    start_new_thread(sample, ())
+    # under gevent time.sleep is cooperative and lets the sampled greenlets run
+    while not done:
+        time.sleep(0.05)
+    return stacks
+
+
+def collapse(frame) -> str:
+    """Returns a stack as module:function frames from the outermost in, joined by ';'"""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _gevent_patched() -> bool:
+    gevent_monkey = sys.modules.get("gevent.monkey")
+    return bool(gevent_monkey and gevent_monkey.is_module_patched("threading"))
+
+
+def _original(module: str, name: str):
+    """Returns a function as it was before any gevent monkey patching"""
+    if _gevent_patched():
+        return sys.modules["gevent.monkey"].get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+######################################################################
+#  S I N G L E   R E Q U E S T   P R O F I L I N G
+######################################################################
+
+
+def _start_request_profile():
+    if "X-Profile" not in request.headers or request.endpoint == "cpu_profile" or _profiling_error():
+        return
+    g.cpu_profile = cProfile.Profile()
+    g.cpu_profile.enable()
+
+
+def _finish_request_profile(response):
+    profile = g.pop("cpu_profile", None)
+    if profile is None:
+        return response
+    profile.disable()
+    sort_key = request.headers["X-Profile"].strip().lower()
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats(sort_key if sort_key in SORT_KEYS else "cumulative").print_stats(PROFILE_STATS_LIMIT)
+    profiled = Response(output.getvalue(), mimetype="text/plain")
+    for name, value in response.headers.items():
+        if name.lower() not in BODY_HEADERS:
+            profiled.headers.add(name, value)
+    profiled.headers["X-Profiled-Status"] = str(response.status_code)
+    return profiled
+
+
+######################################################################
+#  A U T H O R I Z A T I O N
+######################################################################
+
+
+def _profiling_error():
+    """Returns (status, message) unless profiling is enabled and the caller is an admin"""
+    if not current_app.config.get("PROFILING_ENABLED"):
+        return status.HTTP_404_NOT_FOUND, "Profiling is not enabled."
+    return admin_error()
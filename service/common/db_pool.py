@@ -0,0 +1,69 @@
+"""
+Database Connection Pool
+
+This module contains a QueuePool that records how often connections are
+checked out and how long callers waited for one, and a helper that
+reports the state of an engine's pool.
+"""
+import time
+import threading
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that counts checkouts, connects and checkout waits"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def _create_connection(self):
+        with self._stats_lock:
+            self.connects += 1
+        return super()._create_connection()
+
+
+def pool_stats(engine) -> dict:
+    """Returns the current state and counters of the engine's connection pool"""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            timeout=pool.timeout(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._stats_lock:  # pylint: disable=protected-access
+            stats.update(
+                checkouts=pool.checkouts,
+                connects=pool.connects,
+                timeouts=pool.timeouts,
+                wait_seconds_total=round(pool.wait_seconds_total, 6),
+                wait_seconds_max=round(pool.wait_seconds_max, 6),
+                wait_seconds_avg=round(pool.wait_seconds_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+            )
+    return stats
@@ -17,9 +17,11 @@
 """
 Module: error_handlers
 """
-from service.models import DataValidationError
-from service import app, api
+from flask import current_app
+from service.models import DataValidationError, VersionConflictError
+from service import api
 from . import status
+from .metrics import count_error
 
 
 ######################################################################
@@ -29,9 +31,23 @@ from . import status
 def request_validation_error(error):
     """Handles Value Errors from bad data"""
     message = str(error)
-    app.logger.error(message)
+    current_app.logger.error(message)
+    count_error(error)
     return {
         'status_code': status.HTTP_400_BAD_REQUEST,
         'error': 'Bad Request',
         'message': message
     }, status.HTTP_400_BAD_REQUEST
+
+
+@api.errorhandler(VersionConflictError)
+def version_conflict(error):
+    """Handles writes that lost a race with another write of the same Wishlist"""
+    message = str(error)
+    current_app.logger.error(message)
+    count_error(error)
+    return {
+        'status_code': status.HTTP_412_PRECONDITION_FAILED,
+        'error': 'Precondition Failed',
+        'message': message
+    }, status.HTTP_412_PRECONDITION_FAILED
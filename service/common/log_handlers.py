@@ -19,18 +19,212 @@ Log Handlers
 
 This module contains utility functions to set up logging
 consistently
+
+LOG_FORMAT selects plain text lines or one JSON object per line. Every
+request gets a correlation id, taken from its X-Request-ID header or made
+up, that is returned in the X-Request-ID response header and added to the
+JSON log lines. LOG_SAMPLE_RATE keeps the info and debug lines of only
+that share of requests; warnings and errors are always logged. With
+LOG_QUEUE the request threads only put records on a queue and a
+background thread writes them out; apps that share a logger share its
+queue.
 """
+import os
+import re
+import copy
+import json
+import uuid
+import queue
+import atexit
+import random
 import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener
+from flask import current_app, g, has_request_context, request
+
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+# accepted client supplied correlation ids, anything else is replaced
+REQUEST_ID_PATTERN = re.compile(r"^[\w.:-]{1,128}$")
+
+# the attributes every LogRecord has; the others came in through extra=
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
 
 
 def init_logging(app, logger_name: str):
     """Set up logging for production"""
     app.logger.propagate = False
     gunicorn_logger = logging.getLogger(logger_name)
-    app.logger.handlers = gunicorn_logger.handlers
+    handlers = list(gunicorn_logger.handlers)
     app.logger.setLevel(gunicorn_logger.level)
     # Make all log formats consistent
-    formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s", "%Y-%m-%d %H:%M:%S %z")
-    for handler in app.logger.handlers:
+    if app.config.get("LOG_FORMAT") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+    for handler in handlers:
         handler.setFormatter(formatter)
+    if app.config.get("LOG_QUEUE") and handlers:
+        handlers = [_queue_for(app, handlers).handler]
+    app.logger.handlers = handlers
+    if not any(isinstance(log_filter, RequestLogFilter) for log_filter in app.logger.filters):
+        app.logger.addFilter(RequestLogFilter())
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
     app.logger.info("Logging handler established")
+
+
+######################################################################
+#  C O R R E L A T I O N   I D S   A N D   S A M P L I N G
+######################################################################
+
+
+class RequestLogFilter(logging.Filter):
+    """Adds the request id to records and drops the info lines of unsampled requests"""
+
+    def filter(self, record):
+        if not has_request_context():
+            record.request_id = None
+            return True
+        record.request_id = g.get("request_id")
+        return record.levelno > logging.INFO or g.get("log_sampled", True)
+
+
+def _start_request():
+    request_id = request.headers.get("X-Request-ID", "")
+    g.request_id = request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+    rate = current_app.config.get("LOG_SAMPLE_RATE", 1.0)
+    g.log_sampled = rate >= 1 or random.random() < rate
+
+
+def _finish_request(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+
+######################################################################
+#  J S O N   F O R M A T
+######################################################################
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object on a single line"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+######################################################################
+#  Q U E U E D   O U T P U T
+######################################################################
+
+
+class _PreparedQueueHandler(QueueHandler):
+    """A QueueHandler that keeps the extra attributes and exception of a record"""
+
+    def prepare(self, record):
+        # merge the arguments and render the traceback now, while they are
+        # still valid, but leave the formatting to the handlers behind the queue
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _LogQueue:
+    """The queue and background writer of one logger
+
+    A forked gunicorn worker does not inherit the writer threads of the
+    master, so each child starts its own on new queues.
+    """
+
+    def __init__(self, handlers):
+        self.handlers = tuple(handlers)
+        self.handler = _PreparedQueueHandler(queue.SimpleQueue())
+        self.listener = None
+        self._start()
+
+    def use(self, handlers):
+        """Writes the queued records to these handlers from now on"""
+        self.handlers = tuple(handlers)
+        if self.listener is not None:
+            self.listener.handlers = self.handlers
+
+    def flush(self):
+        """Writes out the queued records and starts a new writer thread"""
+        self.stop()
+        self._start()
+
+    def stop(self):
+        """Writes out the queued records and stops the writer thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _start(self):
+        self.listener = QueueListener(self.handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart(self):
+        if self.listener is not None:
+            self.handler.queue = queue.SimpleQueue()
+            self._start()
+
+
+# the queue of each logger name; every app made by create_app() logs
+# through the same "service" logger, so they share one queue
+_queues = {}
+
+
+def _restart_queues():
+    for log_queue in _queues.values():
+        log_queue._restart()  # pylint: disable=protected-access
+
+
+def _stop_queues():
+    for log_queue in _queues.values():
+        log_queue.stop()
+
+
+os.register_at_fork(after_in_child=_restart_queues)
+atexit.register(_stop_queues)
+
+
+def _queue_for(app, handlers):
+    """Returns the queue of the app's logger, writing to the given handlers"""
+    log_queue = _queues.get(app.logger.name)
+    if log_queue is None:
+        log_queue = _queues[app.logger.name] = _LogQueue(handlers)
+    else:
+        log_queue.use(handlers)
+    app.extensions["log_queue"] = log_queue
+    return log_queue
+
+
+def flush_logs(app=None):
+    """Writes out the queued records of the app, or of every app, before returning"""
+    if app is None:
+        log_queues = list(_queues.values())
+    else:
+        log_queues = [app.extensions["log_queue"]] if "log_queue" in app.extensions else []
+    for log_queue in log_queues:
+        log_queue.flush()
@@ -0,0 +1,132 @@
+"""
+Metrics
+
+This module collects Prometheus metrics for every request: counts,
+latency, requests in flight, errors, and the number of SQL statements and
+database time each request needed. The metrics are served at /metrics.
+
+Under gunicorn each worker is a separate process. When the
+PROMETHEUS_MULTIPROC_DIR environment variable is set, the workers write
+their samples to that directory and /metrics aggregates all of them
+(see the child_exit hook in gunicorn.conf.py).
+"""
+import os
+import time
+from flask import Response, g, request, has_request_context
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_COUNT = Counter(
+    "http_requests_total", "Number of HTTP requests", ["method", "endpoint", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "endpoint"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served", ["method", "endpoint"],
+    multiprocess_mode="livesum",
+)
+REQUEST_ERRORS = Counter(
+    "http_request_errors_total", "Errors raised while serving HTTP requests", ["endpoint", "error"]
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements issued per HTTP request", ["method", "endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in the database per HTTP request", ["method", "endpoint"]
+)
+
+# requests to these paths are not measured
+EXCLUDED_PATHS = ("/metrics", "/admin/profile")
+
+
+def init_metrics(app):
+    """Hooks metrics collection into the app and adds the /metrics endpoint"""
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.teardown_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def count_error(error: Exception):
+    """Counts an error handled by one of the error handlers"""
+    REQUEST_ERRORS.labels(_endpoint(), type(error).__name__).inc()
+
+
+def metrics():
+    """Returns the metrics in the Prometheus text format"""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+######################################################################
+#  R E Q U E S T   H O O K S
+######################################################################
+
+
+def _endpoint():
+    """Returns the route template so label values stay bounded"""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "unmatched"
+
+
+def _start_request():
+    if request.path in EXCLUDED_PATHS:
+        return
+    g.metrics_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+    REQUESTS_IN_PROGRESS.labels(request.method, _endpoint()).inc()
+
+
+def _record_request(response):
+    start = g.get("metrics_start")
+    if start is not None:
+        endpoint = _endpoint()
+        REQUEST_COUNT.labels(request.method, endpoint, response.status_code).inc()
+        REQUEST_LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - start)
+        DB_QUERIES.labels(request.method, endpoint).observe(g.db_queries)
+        DB_SECONDS.labels(request.method, endpoint).observe(g.db_seconds)
+    return response
+
+
+def _finish_request(error):
+    if g.pop("metrics_start", None) is None:
+        return
+    if error is not None:
+        count_error(error)
+    REQUESTS_IN_PROGRESS.labels(request.method, _endpoint()).dec()
+
+
+######################################################################
+#  D A T A B A S E   H O O K S
+######################################################################
+
+
+def _before_cursor_execute(conn, *_args):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, *_args):
+    start = conn.info["query_start"].pop()
+    if has_request_context() and "db_queries" in g:
+        g.db_queries += 1
+        g.db_seconds += time.perf_counter() - start
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
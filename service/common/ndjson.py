@@ -0,0 +1,19 @@
+"""
+Newline Delimited JSON
+
+Helpers to write records as NDJSON, one JSON document per line.
+"""
+import json
+import datetime
+
+
+def json_default(value):
+    """Encodes the values json does not know about, such as timestamps"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_lines(records) -> str:
+    """Returns the records as NDJSON text, each line ending in a newline"""
+    return "".join(json.dumps(record, default=json_default) + "\n" for record in records)
@@ -0,0 +1,157 @@
+"""
+Query Profiler
+
+An opt-in profile of the SQL statements each request issues. With
+QUERY_PROFILER enabled, every response gets a Server-Timing header with
+the statement count and total database time, e.g.
+
+    Server-Timing: db;dur=4.213;desc="3 queries"
+
+and one structured log line with the count, the database time, how many
+statements repeated an earlier one (the signature of an N+1) and the
+slowest statements.
+
+Independently of the profiler, any statement slower than SLOW_QUERY_MS is
+logged with its EXPLAIN plan, in requests and CLI commands alike. Its
+bound parameters are only logged with SLOW_QUERY_LOG_PARAMETERS, since
+they carry user data.
+"""
+import json
+import time
+import heapq
+import logging
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# number of statements listed in the profile log line
+SLOWEST_STATEMENTS = 3
+# statements longer than this are shortened in the profile log line
+STATEMENT_LOG_LENGTH = 200
+
+EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN "}
+EXPLAIN_SAVEPOINT = "query_profiler_explain"
+
+
+def init_query_profiler(app):
+    """Hooks the query profiler into the app and the database engines"""
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def summarize(statements: dict) -> dict:
+    """Returns the totals of the statements recorded for one request
+
+    Args:
+        statements (dict): statement text -> [count, total seconds, slowest seconds]
+    """
+    slowest = heapq.nlargest(SLOWEST_STATEMENTS, statements.items(), key=lambda item: item[1][2])
+    return {
+        "queries": sum(count for count, _, _ in statements.values()),
+        "db_ms": round(sum(seconds for _, seconds, _ in statements.values()) * 1000, 3),
+        "repeated": sum(count - 1 for count, _, _ in statements.values()),
+        "slowest": [
+            {"ms": round(slowest_seconds * 1000, 3), "count": count, "statement": statement[:STATEMENT_LOG_LENGTH]}
+            for statement, (count, _, slowest_seconds) in slowest
+        ],
+    }
+
+
+######################################################################
+#  R E Q U E S T   H O O K S
+######################################################################
+
+
+def _start_request():
+    if current_app.config.get("QUERY_PROFILER"):
+        g.query_profile = {}
+
+
+def _record_request(response):
+    statements = g.pop("query_profile", None)
+    if statements is None:
+        return response
+    profile = summarize(statements)
+    response.headers.add("Server-Timing", f'db;dur={profile["db_ms"]};desc="{profile["queries"]} queries"')
+    if current_app.logger.isEnabledFor(logging.INFO):
+        profile.update(method=request.method, path=request.path, status=response.status_code)
+        current_app.logger.info("Query profile: %s", json.dumps(profile))
+    return response
+
+
+######################################################################
+#  D A T A B A S E   H O O K S
+######################################################################
+
+
+def _before_cursor_execute(conn, *_args):
+    conn.info.setdefault("profiler_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, _context, executemany):
+    elapsed = time.perf_counter() - conn.info["profiler_start"].pop()
+    if not has_app_context():
+        return
+    if has_request_context() and "query_profile" in g:
+        totals = g.query_profile.setdefault(statement, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] = max(totals[2], elapsed)
+    threshold = current_app.config.get("SLOW_QUERY_MS")
+    if threshold and elapsed * 1000 >= threshold:
+        plan = None
+        if not executemany:
+            try:
+                plan = explain(conn.dialect.name, cursor, statement, parameters)
+            except Exception as error:  # pylint: disable=broad-except
+                plan = f"EXPLAIN failed: {error}"
+        if current_app.config.get("SLOW_QUERY_LOG_PARAMETERS"):
+            current_app.logger.warning(
+                "Slow query (%.1f ms): %s\nParameters: %r\nPlan:\n%s",
+                elapsed * 1000, statement, parameters, plan or "not available",
+            )
+        else:
+            current_app.logger.warning(
+                "Slow query (%.1f ms): %s\nPlan:\n%s", elapsed * 1000, statement, plan or "not available"
+            )
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("profiler_start"):
+        context.connection.info["profiler_start"].pop()
+
+
+def explain(dialect: str, cursor, statement: str, parameters):
+    """Returns the plan of a SELECT statement, or None for other statements
+
+    The EXPLAIN runs on a new cursor of the same DBAPI connection, so it
+    sees the same transaction and does not fire the engine events again.
+    On PostgreSQL it runs inside a SAVEPOINT, so an EXPLAIN that fails is
+    rolled back alone instead of aborting the caller's transaction.
+    """
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    connection = cursor.connection
+    savepoint = dialect == "postgresql" and not getattr(connection, "autocommit", False)
+    explain_cursor = connection.cursor()
+    try:
+        if savepoint:
+            explain_cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            explain_cursor.execute(EXPLAIN_PREFIX.get(dialect, "EXPLAIN ") + statement, parameters)
+            rows = explain_cursor.fetchall()
+        except Exception:
+            if savepoint:
+                explain_cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            raise
+        if savepoint:
+            explain_cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        # PostgreSQL returns one line per row, SQLite the detail in the last column
+        return "\n".join(str(row[-1]) for row in rows)
+    finally:
+        explain_cursor.close()
@@ -0,0 +1,131 @@
+"""
+Response Serializers
+
+flask-restx's marshal_with walks every response field by field, through
+the generic Field.output machinery, after the models have already built
+a dictionary with serialize(). This module compiles a Swagger model once
+into a plain function that turns those dictionaries into the documented
+response shape in a single pass, and encodes responses straight to JSON
+bytes with orjson when it is installed.
+
+The Swagger models stay the single description of the response, so the
+API docs and the compiled serializers cannot drift apart.
+"""
+import json
+import datetime
+from flask import current_app, make_response
+from flask_restx import fields
+from service.common.ndjson import json_default
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+# values of these field types are passed through when they already have the type
+SCALAR_TYPES = (
+    (fields.Boolean, bool),
+    (fields.Integer, int),
+    (fields.Float, float),
+    (fields.String, str),
+)
+
+
+def compile_serializer(model, skip_none=False):
+    """Returns a function that serializes dictionaries like marshal(data, model)
+
+    Args:
+        model: a flask-restx Model (or a dict of fields)
+        skip_none (bool): leave out the keys whose value is None
+
+    The function takes one dictionary, or a list of them, as built by the
+    serialize() methods of the models.
+    """
+    plan = tuple(
+        (key, getattr(field, "attribute", None) or key, _converter(field))
+        for key, field in getattr(model, "resolved", model).items()
+    )
+
+    def serialize_one(data):
+        result = {}
+        for key, attribute, convert in plan:
+            value = convert(data.get(attribute))
+            if value is not None or not skip_none:
+                result[key] = value
+        return result
+
+    def serialize(data):
+        if isinstance(data, list):
+            return [serialize_one(row) for row in data]
+        return serialize_one(data)
+
+    return serialize
+
+
+def _converter(field):
+    """Returns the function that formats the values of one field"""
+    if isinstance(field, type):
+        field = field()
+    if isinstance(field, fields.Nested):
+        nested = compile_serializer(field.nested, skip_none=field.skip_none)
+        allow_null = field.allow_null
+        return lambda value: None if value is None and allow_null else nested(value or {})
+    if isinstance(field, fields.List):
+        item = _converter(field.container)
+        return lambda value: None if value is None else [item(element) for element in value]
+    if isinstance(field, fields.Date):
+        return _date_converter(field)
+    for field_type, python_type in SCALAR_TYPES:
+        if isinstance(field, field_type):
+            return _scalar_converter(field, python_type)
+    return lambda value: _format(field, value)
+
+
+def _scalar_converter(field, python_type):
+    def convert(value):
+        if type(value) is python_type:  # pylint: disable=unidiomatic-typecheck
+            return value
+        return _format(field, value)
+    return convert
+
+
+def _date_converter(field):
+    def convert(value):
+        if isinstance(value, datetime.datetime):
+            return value.date().isoformat()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return _format(field, value)
+    return convert
+
+
+def _format(field, value):
+    """Formats a value the way the field's own output() would"""
+    if value is None:
+        value = field.default() if callable(field.default) else field.default
+        if not value:
+            return value
+    return field.format(value)
+
+
+######################################################################
+#  J S O N   E N C O D I N G
+######################################################################
+
+
+def dumps(data) -> bytes:
+    """Encodes a response body as JSON bytes, using orjson if enabled"""
+    if orjson is not None and current_app.config.get("FAST_JSON"):
+        return orjson.dumps(data, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data, separators=(",", ":"), default=json_default) + "\n").encode()
+
+
+def output_json(data, code, headers=None):
+    """Makes a Flask response with a JSON encoded body
+
+    Registered with api.representation('application/json') in place of
+    the flask-restx default, which always goes through the json module.
+    """
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    return response
@@ -2,6 +2,7 @@
 Global Configuration for Application
 """
 import os
+from service.common.db_pool import InstrumentedQueuePool
 
 # Get configuration from environment
 DATABASE_URI = os.getenv(
@@ -12,5 +13,72 @@ DATABASE_URI = os.getenv(
 SQLALCHEMY_DATABASE_URI = DATABASE_URI
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Connection pool settings for each worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("true", "1", "yes")
+# Per statement timeout in milliseconds on PostgreSQL (0 disables it)
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+
+
+def engine_options(settings) -> dict:
+    """Returns the SQLALCHEMY_ENGINE_OPTIONS for the database an app is configured with
+
+    They depend on the effective SQLALCHEMY_DATABASE_URI, which create_app()
+    may override, so they are built per app rather than at import.
+    """
+    uri = settings["SQLALCHEMY_DATABASE_URI"]
+    options = {"pool_pre_ping": settings["DB_POOL_PRE_PING"]}
+    if not uri.startswith("sqlite"):
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings["DB_POOL_SIZE"],
+            max_overflow=settings["DB_MAX_OVERFLOW"],
+            pool_timeout=settings["DB_POOL_TIMEOUT"],
+            pool_recycle=settings["DB_POOL_RECYCLE"],
+        )
+    if settings["DB_STATEMENT_TIMEOUT"] and uri.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={settings['DB_STATEMENT_TIMEOUT']}"}
+    return options
+
+
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "s3cr3t-key-shhhh")
+
+# Keyset pagination for list endpoints
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+# Maximum number of Items accepted by one batch insert request
+ITEM_BATCH_MAX = int(os.getenv("ITEM_BATCH_MAX", "500"))
+
+# Read-through cache for single Wishlist reads (CACHE_MAX_SIZE=0 disables it)
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "5"))
+
+# Encode JSON responses with orjson when it is installed
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() in ("true", "1", "yes")
+
+# Per request SQL statement counts and timings in a Server-Timing header and a log line
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "false").lower() in ("true", "1", "yes")
+# Log statements slower than this many milliseconds with their plan (0 disables it)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+# Also log the bound parameters of slow statements; they hold user data, so this is off by default
+SLOW_QUERY_LOG_PARAMETERS = os.getenv("SLOW_QUERY_LOG_PARAMETERS", "false").lower() in ("true", "1", "yes")
+
+# Admin-only CPU profiling: /admin/profile and the X-Profile request header
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("true", "1", "yes")
+# Bearer token of the admin endpoints that require one; they are disabled while it is empty
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "20"))
+# The gunicorn worker timeout (0 for none); profiles are kept shorter so the
+# arbiter does not kill the worker that is sampling
+WORKER_TIMEOUT = float(os.getenv("GUNICORN_TIMEOUT", "30"))
+
+# Logging: "text" or one JSON object per line, the share of requests whose info
+# lines are kept, and whether records are written by a background thread
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE = os.getenv("LOG_QUEUE", "true").lower() in ("true", "1", "yes")
@@ -0,0 +1,208 @@
+"""
+Schema Migrations
+
+Versioned, forward-only schema changes for databases that were created
+by an earlier release of the service. db.create_all() only creates
+missing tables, so anything added to an existing table (indexes,
+columns) has to be shipped as a migration here.
+
+Each migration is a function registered with @migration(version, ...)
+that receives a Connection and runs in its own transaction, in which its
+version is recorded in the schema_version table. On PostgreSQL a
+migration registered with autocommit=True runs outside any transaction
+instead, so it can build indexes with CREATE INDEX CONCURRENTLY without
+blocking writes; it must be safe to run again if it fails part way.
+"""
+import logging
+import datetime
+from sqlalchemy import inspect, text
+from service.models import db, SEARCH_INDEXES
+
+logger = logging.getLogger("flask.app")
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes upgrades
+UPGRADE_LOCK_ID = 281_420_003
+
+schema_version = db.Table(
+    "schema_version",
+    db.Column("version", db.Integer, primary_key=True, autoincrement=False),
+    db.Column("description", db.String(255), nullable=False),
+    db.Column("applied_at", db.DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str, autocommit: bool = False):
+    """Registers a function as the migration to the given schema version"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func, autocommit))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return decorator
+
+
+######################################################################
+#  M I G R A T I O N S
+######################################################################
+
+
+@migration(1, "Index the wishlist and item lookup columns", autocommit=True)
+def add_lookup_indexes(conn):
+    """Adds the indexes used by the owner, name and wishlist lookups"""
+    create_index(conn, "ix_wishlist_name", "wishlist (name)")
+    create_index(conn, "ix_wishlist_owner_id_id", "wishlist (owner_id, id)")
+    create_index(conn, "ix_item_product_name", "item (product_name)")
+    create_index(conn, "ix_item_wishlist_id_product_id", "item (wishlist_id, product_id)")
+
+
+@migration(2, "Add a version column to wishlist for ETags")
+def add_wishlist_version(conn):
+    """Adds the version counter that is bumped on every Wishlist or Item change"""
+    if not _has_column(conn, "wishlist", "version"):
+        conn.execute(text("ALTER TABLE wishlist ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+@migration(3, "Index lower(product_name) per wishlist for item name search", autocommit=True)
+def add_item_name_search_index(conn):
+    """Adds the index behind the case-insensitive, wishlist scoped item name search"""
+    # text_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%' in any collation
+    opclass = " text_pattern_ops" if conn.dialect.name == "postgresql" else ""
+    create_index(conn, "ix_item_wishlist_id_lower_product_name", f"item (wishlist_id, lower(product_name){opclass})")
+
+
+@migration(4, "Index the full-text search vectors of wishlist and item on PostgreSQL", autocommit=True)
+def add_search_indexes(conn):
+    """Adds the GIN expression indexes used by /api/search
+
+    They index to_tsvector() of the names instead of a stored column, so
+    the tables are not rewritten, and they are built concurrently, so
+    reads and writes carry on while they build.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    for name, definition in SEARCH_INDEXES.values():
+        create_index(conn, name, definition)
+
+
+@migration(5, "Add an updated_at column to wishlist for the owner summary")
+def add_wishlist_updated_at(conn):
+    """Adds the modification time that is set together with the version
+
+    Existing rows are not backfilled, which would rewrite and lock the
+    whole table; readers fall back to created_at while it is NULL.
+    """
+    if not _has_column(conn, "wishlist", "updated_at"):
+        conn.execute(text("ALTER TABLE wishlist ADD COLUMN updated_at TIMESTAMP"))
+
+
+######################################################################
+#  U P G R A D E   H E L P E R S
+######################################################################
+
+
+def current_version(conn) -> int:
+    """Returns the schema version of the database, 0 if it was never migrated"""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    version = conn.execute(db.select(db.func.max(schema_version.c.version))).scalar()
+    return version or 0
+
+
+def head_version() -> int:
+    """Returns the newest schema version known to this release"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def stamp(conn):
+    """Records every migration as applied without running it"""
+    schema_version.create(conn, checkfirst=True)
+    applied = set(conn.execute(db.select(schema_version.c.version)).scalars())
+    for version, description, _, _ in MIGRATIONS:
+        if version not in applied:
+            _record(conn, version, description)
+
+
+def upgrade() -> list:
+    """
+    Brings the database schema up to date
+
+    An empty database gets the current schema from the models and is
+    stamped with the head version. An existing database has every
+    pending migration applied in order, each in its own transaction, so
+    a failed upgrade stops at the last migration that completed. On
+    PostgreSQL an advisory lock held for the whole upgrade keeps two
+    upgrades from running at once.
+
+    Returns:
+        the list of migration versions that were applied
+    """
+    applied = []
+    with db.engine.connect() as conn:
+        postgresql = conn.dialect.name == "postgresql"
+        if postgresql:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": UPGRADE_LOCK_ID})
+            conn.commit()
+        try:
+            with conn.begin():
+                if not inspect(conn).has_table("wishlist"):
+                    logger.info("Creating schema at version %s", head_version())
+                    db.metadata.create_all(conn)
+                    stamp(conn)
+                    return applied
+                schema_version.create(conn, checkfirst=True)
+                version = current_version(conn)
+
+            for target, description, func, autocommit in MIGRATIONS:
+                if target <= version:
+                    continue
+                logger.info("Migrating schema to version %s: %s", target, description)
+                if autocommit and postgresql:
+                    with db.engine.connect() as autocommit_conn:
+                        func(autocommit_conn.execution_options(isolation_level="AUTOCOMMIT"))
+                    with conn.begin():
+                        _record(conn, target, description)
+                else:
+                    with conn.begin():
+                        func(conn)
+                        _record(conn, target, description)
+                applied.append(target)
+        finally:
+            if postgresql:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": UPGRADE_LOCK_ID})
+                conn.commit()
+    return applied
+
+
+def create_index(conn, name: str, definition: str):
+    """Creates an index unless it exists, without blocking writes on PostgreSQL
+
+    On PostgreSQL the index is built with CREATE INDEX CONCURRENTLY, which
+    only works on an autocommit connection. A concurrent build that failed
+    leaves an invalid index behind; it is dropped and built again.
+
+    Args:
+        name (str): the name of the index
+        definition (str): the table and the indexed columns, e.g. "item (product_name)"
+    """
+    if conn.dialect.name != "postgresql":
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+        return
+    invalid = conn.execute(
+        text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+    conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+
+def _has_column(conn, table, column):
+    return column in {info["name"] for info in inspect(conn).get_columns(table)}
+
+
+def _record(conn, version, description):
+    conn.execute(
+        schema_version.insert().values(
+            version=version, description=description, applied_at=datetime.datetime.now()
+        )
+    )
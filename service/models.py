@@ -6,7 +6,10 @@ All of the models are stored in this module
 import logging
 import datetime
 from flask_sqlalchemy import SQLAlchemy
-from flask import Flask
+from sqlalchemy import DDL, event, inspect
+from sqlalchemy.orm import selectinload
+from flask import Flask, current_app
+from service.common.cache import make_cache
 
 logger = logging.getLogger("flask.app")
 
@@ -16,30 +19,56 @@ db = SQLAlchemy()
 
 # Function to initialize the database
 def init_db(app):
-    """ Initializes the SQLAlchemy app """
+    """ Initializes the SQLAlchemy app
+
+    Safe to call more than once, and does not connect to the database:
+    the tables are created by `flask db-upgrade` (see service.migrations)
+    before the service starts, not by every worker as it boots.
+    """
+    if "wishlist_cache" not in app.extensions:
+        app.extensions["wishlist_cache"] = make_cache(app.config["CACHE_MAX_SIZE"], app.config["CACHE_TTL"])
     Wishlist.init_db(app)
     Item.init_db(app)
 
 
+def get_cache():
+    """ Returns the cache of serialized Wishlists for the current app """
+    return current_app.extensions["wishlist_cache"]
+
+
 class DataValidationError(Exception):
     """ Used for an data validation errors when deserializing """
 
 
+class VersionConflictError(Exception):
+    """ Used when a Wishlist was changed since the version a write expected """
+
+
 class Wishlist(db.Model):
     """
     Class that represents a Wishlist
     """
 
-    app = None
+    # the columns a client may select with find_projected()
+    PROJECTABLE_FIELDS = ("id", "name", "owner_id", "created_at")
+    # how find_projected() returns the Items of each Wishlist
+    EMBED_OPTIONS = ("items", "none", "count")
 
     # Table Schema
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(63), nullable=False)
+    name = db.Column(db.String(63), nullable=False, index=True)
     owner_id = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.now())
+    # bumped on every change to the Wishlist or its Items, used for ETags
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # set with the version; NULL for bulk imported rows, which fall back to created_at
+    updated_at = db.Column(db.DateTime)
     wishlist_items = db.relationship("Item", backref="wishlist", cascade="all, delete", lazy=True)
 
+    # (owner_id, id) serves both owner lookups and paginated owner listings
+    __table_args__ = (db.Index("ix_wishlist_owner_id_id", "owner_id", "id"),)
+
     def __repr__(self):
         return f"<Wishlist {self.name} id=[{self.id}]>"
 
@@ -49,23 +78,51 @@ class Wishlist(db.Model):
         """
         logger.info("Creating %s", self.name)
         self.id = None  # pylint: disable=invalid-name
+        self.updated_at = datetime.datetime.now()
         db.session.add(self)
         db.session.commit()
+        Wishlist.invalidate(self.id)
 
-    def update(self):
+    def update(self, expected_version=None):
         """
         Updates a Wishlist to the database
+
+        Args:
+            expected_version (int): only update the Wishlist if it is still at this version
         """
         logger.info("Saving %s", self.name)
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
+        if expected_version is None:
+            self.version = Wishlist.version + 1
+            self.updated_at = datetime.datetime.now()
+        else:
+            Wishlist.touch(self.id, expected_version=expected_version)
         db.session.commit()
+        Wishlist.invalidate(self.id)
 
     def delete(self):
         """ Removes a Wishlist from the data store """
         logger.info("Deleting %s", self.name)
+        wishlist_id = self.id
         db.session.delete(self)
         db.session.commit()
+        Wishlist.invalidate(wishlist_id)
+
+    def clear_items(self):
+        """
+        Removes every Item from the Wishlist with a single DELETE statement
+
+        Returns:
+            the number of Items that were removed
+        """
+        logger.info("Clearing items from %s", self.name)
+        count = Item.query.filter(Item.wishlist_id == self.id).delete(synchronize_session=False)
+        Wishlist.touch(self.id)
+        db.session.commit()
+        Wishlist.invalidate(self.id)
+        db.session.expire(self, ["wishlist_items"])
+        return count
 
     def serialize(self):
         """ Serializes a Wishlist into a dictionary """
@@ -77,6 +134,7 @@ class Wishlist(db.Model):
             "name": self.name,
             "owner_id": self.owner_id,
             "created_at": self.created_at,
+            "version": self.version,
             "wishlist_items": items
         }
 
@@ -119,11 +177,9 @@ class Wishlist(db.Model):
     def init_db(cls, app: Flask):
         """ Initializes the database session """
         logger.info("Initializing Wishlist database")
-        cls.app = app
         # This is where we initialize SQLAlchemy from the Flask app
-        db.init_app(app)
-        app.app_context().push()
-        db.create_all()  # make our sqlalchemy tables
+        if "sqlalchemy" not in app.extensions:
+            db.init_app(app)
 
     @classmethod
     def all(cls):
@@ -137,6 +193,64 @@ class Wishlist(db.Model):
         logger.info("Processing lookup for wishlist id %s ...", wishlist_id)
         return cls.query.get(wishlist_id)
 
+    @classmethod
+    def find_serialized(cls, wishlist_id):
+        """Returns the serialized Wishlist with the given id, or None
+
+        Reads through the Wishlist cache, so repeated reads of the same
+        Wishlist do not hit the database. The returned dictionary is
+        shared with the cache and must not be modified.
+        """
+        cache = get_cache()
+        data = cache.get(wishlist_id)
+        if data is None:
+            wishlist = cls.find(wishlist_id)
+            if not wishlist:
+                return None
+            data = wishlist.serialize()
+            cache.set(wishlist_id, data)
+        return data
+
+    @classmethod
+    def find_version(cls, wishlist_id, cached=True):
+        """Returns the version of the Wishlist with the given id, or None
+
+        Uses the cached copy when there is one, otherwise reads the single
+        column without loading the Wishlist or its Items. Writes pass
+        cached=False so they never act on a stale copy.
+        """
+        data = get_cache().get(wishlist_id) if cached else None
+        if data is not None:
+            return data["version"]
+        logger.info("Processing version lookup for wishlist id %s ...", wishlist_id)
+        return db.session.query(cls.version).filter(cls.id == wishlist_id).scalar()
+
+    @classmethod
+    def touch(cls, *wishlist_ids, expected_version=None):
+        """Bumps the version and modification time of the given Wishlists in the current transaction
+
+        Called whenever Items change so the ETag of the Wishlist changes too.
+        With an expected_version the check and the bump are one conditional
+        UPDATE, so of two writes that expect the same version only the first
+        one succeeds; the other is rolled back with VersionConflictError.
+        """
+        query = cls.query.filter(cls.id.in_(wishlist_ids))
+        if expected_version is not None:
+            query = query.filter(cls.version == expected_version)
+        updated = query.update(
+            {cls.version: cls.version + 1, cls.updated_at: datetime.datetime.now()}, synchronize_session=False
+        )
+        if expected_version is not None and not updated:
+            db.session.rollback()
+            raise VersionConflictError(f"Wishlist with id '{wishlist_ids[0]}' has been modified since it was read.")
+
+    @classmethod
+    def invalidate(cls, *wishlist_ids):
+        """Drops the given Wishlists from the cache after they were changed"""
+        cache = get_cache()
+        for wishlist_id in wishlist_ids:
+            cache.delete(wishlist_id)
+
     @classmethod
     def find_by_name(cls, name):
         """Returns all Wishlist with the given name
@@ -153,9 +267,102 @@ class Wishlist(db.Model):
         Args:
             name (string): the name of the WishlistModels you want to match
         """
-        logger.info("Processing owner id query for %s ...", str(owner_id))
+        logger.info("Processing owner id query for %s ...", owner_id)
         return cls.query.filter(cls.owner_id == owner_id)
 
+    @classmethod
+    def summarize_owner(cls, owner_id):
+        """Returns the Wishlist and Item totals of an owner
+
+        One aggregate statement over the owner's rows of the
+        (owner_id, id) index joined to the Items through the
+        (wishlist_id, product_id) index, so no Wishlist or Item is loaded.
+
+        Returns:
+            a dictionary with the wishlist_count, item_count, total_quantity
+            and last_modified time, which is None if the owner has no Wishlists
+        """
+        logger.info("Processing summary query for owner id %s ...", owner_id)
+        row = (
+            db.session.query(
+                db.func.count(db.distinct(cls.id)).label("wishlist_count"),
+                db.func.count(Item.id).label("item_count"),
+                db.func.coalesce(db.func.sum(Item.item_quantity), 0).label("total_quantity"),
+                db.func.max(db.func.coalesce(cls.updated_at, cls.created_at)).label("last_modified"),
+            )
+            .select_from(cls)
+            .outerjoin(Item, Item.wishlist_id == cls.id)
+            .filter(cls.owner_id == owner_id)
+            .one()
+        )
+        return {"owner_id": owner_id, **row._asdict()}
+
+    @classmethod
+    def find_projected(cls, fields=None, embed="items", limit=None, after=None, query=None):
+        """Returns Wishlists as dictionaries holding only the requested data
+
+        Only the requested columns are selected. Items are loaded with one
+        IN (...) query for embed="items", not at all for embed="none", and
+        counted by a correlated COUNT subquery for embed="count". The id
+        and version are always included so callers can page and build
+        ETags.
+
+        Args:
+            fields (list): names from PROJECTABLE_FIELDS, None for all of them
+            embed (str): "items", "none" or "count"
+            limit (int): the maximum number of Wishlists to return
+            after (int): only return Wishlists with an id greater than this cursor
+            query (Query): an optional filtered query, e.g. from find_by_owner_id()
+        """
+        logger.info("Processing projected query of %s with embed=%s ...", fields, embed)
+        columns = [cls.id, cls.version]
+        columns.extend(getattr(cls, name) for name in fields or cls.PROJECTABLE_FIELDS if name != "id")
+        if embed == "count":
+            item_count = db.select(db.func.count(Item.id)).where(Item.wishlist_id == cls.id)
+            columns.append(item_count.scalar_subquery().label("item_count"))
+        if query is None:
+            query = cls.query
+        if after is not None:
+            query = query.filter(cls.id > after)
+        query = query.with_entities(*columns).order_by(cls.id)
+        if limit is not None:
+            query = query.limit(limit)
+        results = [row._asdict() for row in query]
+        if embed == "items" and results:
+            items = {}
+            wishlist_ids = [result["id"] for result in results]
+            for item in Item.query.filter(Item.wishlist_id.in_(wishlist_ids)).order_by(Item.id):
+                items.setdefault(item.wishlist_id, []).append(item.serialize())
+            for result in results:
+                result["wishlist_items"] = items.get(result["id"], [])
+        return results
+
+    @classmethod
+    def export_chunks(cls, chunk_size=1000):
+        """Yields every Wishlist with its Items, serialized, in chunks
+
+        The wishlist table is read through a server-side cursor
+        (yield_per) and the Items of each chunk are loaded with one
+        IN (...) query. Each chunk is expunged from the session once it
+        is serialized, so memory use stays constant however large the
+        tables are.
+
+        Args:
+            chunk_size (int): the number of Wishlists per chunk
+        """
+        logger.info("Processing export in chunks of %s ...", chunk_size)
+        query = (
+            db.select(cls)
+            .order_by(cls.id)
+            .options(selectinload(cls.wishlist_items))
+            .execution_options(yield_per=chunk_size)
+        )
+        for partition in db.session.scalars(query).partitions():
+            chunk = [wishlist.serialize() for wishlist in partition]
+            for wishlist in partition:
+                db.session.expunge(wishlist)
+            yield chunk
+
     @classmethod
     def find_or_404(cls, wishlist_id):
         """ Finds a wishlist item by it's ID """
@@ -168,8 +375,6 @@ class Item(db.Model):
     Class that represents a Item
     """
 
-    app = None
-
     # Table Schema
 
     id = db.Column(db.Integer, primary_key=True)
@@ -177,7 +382,20 @@ class Item(db.Model):
         db.Integer, db.ForeignKey("wishlist.id", ondelete="CASCADE"), nullable=False)
     product_id = db.Column(db.Integer, nullable=False)
     item_quantity = db.Column(db.Integer, nullable=False, default=1)
-    product_name = db.Column(db.String(63), nullable=False)
+    product_name = db.Column(db.String(63), nullable=False, index=True)
+
+    # (wishlist_id, product_id) also serves lookups on wishlist_id alone;
+    # (wishlist_id, lower(product_name)) serves the case-insensitive name
+    # search within a wishlist, prefix matches included on PostgreSQL
+    __table_args__ = (
+        db.Index("ix_item_wishlist_id_product_id", "wishlist_id", "product_id"),
+        db.Index(
+            "ix_item_wishlist_id_lower_product_name",
+            wishlist_id,
+            db.func.lower(product_name).label("lower_product_name"),
+            postgresql_ops={"lower_product_name": "text_pattern_ops"},
+        ),
+    )
 
     def __repr__(self):
         return f"<Item {self.product_name} id=[{self.id}]>"
@@ -189,22 +407,63 @@ class Item(db.Model):
         logger.info("Creating %s", self.product_name)
         self.id = None  # pylint: disable=invalid-name
         db.session.add(self)
+        Wishlist.touch(self.wishlist_id)
         db.session.commit()
+        Wishlist.invalidate(self.wishlist_id)
+
+    @classmethod
+    def create_many(cls, items):
+        """
+        Creates several Items in the database in a single transaction
+
+        The rows are flushed together, so SQLAlchemy sends them as
+        multi-row INSERT statements instead of one INSERT per Item.
 
-    def update(self):
+        Returns:
+            the serialized Items, taken before the commit expires them
+            so that they are not reloaded one SELECT at a time
+        """
+        logger.info("Creating %d items", len(items))
+        for item in items:
+            item.id = None  # pylint: disable=invalid-name
+        wishlist_ids = {item.wishlist_id for item in items}
+        db.session.add_all(items)
+        Wishlist.touch(*wishlist_ids)
+        db.session.flush()
+        serialized = [item.serialize() for item in items]
+        db.session.commit()
+        Wishlist.invalidate(*wishlist_ids)
+        return serialized
+
+    def update(self, expected_version=None):
         """
         Updates an Item to the database
+
+        Args:
+            expected_version (int): only update the Item if its Wishlist is still at this version
         """
         logger.info("Saving %s", self.product_name)
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
+        # the Item may have been moved from another Wishlist
+        wishlist_ids = {self.wishlist_id, *inspect(self).attrs.wishlist_id.history.deleted}
+        touched = wishlist_ids
+        if expected_version is not None:
+            Wishlist.touch(self.wishlist_id, expected_version=expected_version)
+            touched = wishlist_ids - {self.wishlist_id}
+        if touched:
+            Wishlist.touch(*touched)
         db.session.commit()
+        Wishlist.invalidate(*wishlist_ids)
 
     def delete(self):
         """ Removes an Item from the data store """
         logger.info("Deleting product %s from wishlist %s", self.product_name, self.wishlist_id)
+        wishlist_id = self.wishlist_id
         db.session.delete(self)
+        Wishlist.touch(wishlist_id)
         db.session.commit()
+        Wishlist.invalidate(wishlist_id)
 
     def serialize(self):
         """ Serializes an Item into a dictionary """
@@ -252,11 +511,9 @@ class Item(db.Model):
     def init_db(cls, app: Flask):
         """ Initializes the database session """
         logger.info("Initializing Item database")
-        cls.app = app
         # This is where we initialize SQLAlchemy from the Flask app
-        db.init_app(app)
-        app.app_context().push()
-        db.create_all()  # make our sqlalchemy tables
+        if "sqlalchemy" not in app.extensions:
+            db.init_app(app)
 
     @classmethod
     def all(cls):
@@ -283,20 +540,99 @@ class Item(db.Model):
     @classmethod
     def find_by_wishlist_id(cls, wishlist_id):
         """Returns all Item with the given wishlist id"""
-        logger.info("Processing owner id query for %s ...", str(wishlist_id))
+        logger.info("Processing owner id query for %s ...", wishlist_id)
         return cls.query.filter(cls.wishlist_id == wishlist_id)
 
+    @classmethod
+    def find_by_wishlist_and_name(cls, wishlist_id, name, prefix=False):
+        """Returns the Items of a Wishlist whose product name matches, ignoring case
+
+        Args:
+            wishlist_id (int): the Wishlist to search in
+            name (string): the product name, or the start of it
+            prefix (bool): match every product name that starts with name
+        """
+        logger.info("Processing name query for %s in wishlist %s ...", name, wishlist_id)
+        product_name = db.func.lower(cls.product_name)
+        if prefix:
+            pattern = name.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            condition = product_name.like(pattern + "%", escape="\\")
+        else:
+            condition = product_name == name.lower()
+        return cls.query.filter(cls.wishlist_id == wishlist_id, condition)
+
+    @classmethod
+    def find_page(cls, limit, after=None, query=None):
+        """Returns one page of Items ordered by id
+
+        Args:
+            limit (int): the maximum number of Items to return
+            after (int): only return Items with an id greater than this cursor
+            query (Query): an optional filtered query, e.g. from find_by_wishlist_id()
+        """
+        logger.info("Processing item page query after id %s (limit %s) ...", after, limit)
+        if query is None:
+            query = cls.query
+        if after is not None:
+            query = query.filter(cls.id > after)
+        return query.order_by(cls.id).limit(limit).all()
+
     @classmethod
     def find_by_wishlist_and_item_id(cls, wishlist_id, item_id):
         """Returns the Item with the given item id and wishlist id"""
-        logger.info("Processing query for wishlist id %s and item id %s ...", str(wishlist_id), str(item_id))
-        item = cls.query.get(item_id)
-        if item and item.wishlist_id == wishlist_id:
-            return item
-        return None
+        logger.info("Processing query for wishlist id %s and item id %s ...", wishlist_id, item_id)
+        return cls.query.filter(cls.id == item_id, cls.wishlist_id == wishlist_id).first()
+
+    @classmethod
+    def find_with_wishlist(cls, wishlist_id, item_id):
+        """Returns the Wishlist and its Item with the given ids in one query
+
+        The Item is outer joined to the Wishlist, so the caller can tell a
+        missing Wishlist from a missing Item without a second round trip.
+
+        Returns:
+            (wishlist, item): wishlist is None if there is no such Wishlist,
+            item is None if the Wishlist has no Item with that id
+        """
+        logger.info("Processing query for wishlist id %s with item id %s ...", wishlist_id, item_id)
+        row = (
+            db.session.query(Wishlist, cls)
+            .outerjoin(cls, db.and_(cls.wishlist_id == Wishlist.id, cls.id == item_id))
+            .filter(Wishlist.id == wishlist_id)
+            .first()
+        )
+        if row is None:
+            return None, None
+        return row[0], row[1]
 
     @classmethod
     def find_or_404(cls, item_id):
         """ Finds an Item item by it's ID """
         logger.info("Processing lookup or 404 for id %s ...", item_id)
         return cls.query.get_or_404(item_id)
+
+
+######################################################################
+#  F U L L   T E X T   S E A R C H   C O L U M N S
+######################################################################
+
+# On PostgreSQL service.search matches these tsvectors of the searchable
+# names through GIN expression indexes, so no column has to be added to the
+# tables or kept up to date. Other databases go without them and
+# service.search falls back to an in-memory index.
+SEARCH_VECTORS = {
+    "wishlist": "to_tsvector('simple', coalesce(name, ''))",
+    "item": "to_tsvector('simple', coalesce(product_name, ''))",
+}
+# table -> (index name, index definition)
+SEARCH_INDEXES = {
+    "wishlist": ("ix_wishlist_name_search", f"wishlist USING GIN ({SEARCH_VECTORS['wishlist']})"),
+    "item": ("ix_item_product_name_search", f"item USING GIN ({SEARCH_VECTORS['item']})"),
+}
+
+for _table in (Wishlist.__table__, Item.__table__):
+    _name, _definition = SEARCH_INDEXES[_table.name]
+    event.listen(
+        _table, "after_create",
+        DDL(f"CREATE INDEX IF NOT EXISTS {_name} ON {_definition}").execute_if(dialect="postgresql"),
+    )
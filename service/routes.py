@@ -4,13 +4,20 @@ My Service
 Describe what your service does here
 """
 
-from flask import jsonify
+from functools import lru_cache
+from flask import Response, current_app, jsonify, request, stream_with_context
+from werkzeug.http import http_date, quote_etag
 from flask_restx import fields, reqparse, Resource
 from service.common import status  # HTTP Status Codes
-from service.models import Wishlist, Item
+from service.common.admin import admin_only
+from service.common.db_pool import pool_stats
+from service.common.ndjson import dumps_lines
+from service.common.serializers import compile_serializer, output_json
+from service.models import db, Wishlist, Item, DataValidationError, get_cache
+from service import search
 
 # Import Flask application
-from . import app, api
+from . import api, blueprint
 
 # MODELS
 
@@ -47,13 +54,76 @@ wishlist_model = api.inherit(
     }
 )
 
+batch_result_model = api.model('ItemBatchResult', {
+    'index': fields.Integer(description='The position of the row in the posted array'),
+    'status': fields.Integer(description='The HTTP status code for the row'),
+    'item': fields.Nested(item_model, allow_null=True, skip_none=True, description='The created item'),
+    'error': fields.String(description='Why the row was rejected'),
+})
+
+search_hit_model = api.model('SearchHit', {
+    'type': fields.String(description='What matched: wishlist or item'),
+    'id': fields.Integer(description='The id of the wishlist or item'),
+    'wishlist_id': fields.Integer(description='The wishlist that matched or that holds the item'),
+    'owner_id': fields.Integer(description='The owner of the wishlist'),
+    'name': fields.String(description='The wishlist name or product name that matched'),
+    'rank': fields.Float(description='How well the name matches, higher is better'),
+})
+
+owner_summary_model = api.model('OwnerSummary', {
+    'owner_id': fields.Integer(description='The owner of the wishlists'),
+    'wishlist_count': fields.Integer(description='The number of wishlists of the owner'),
+    'item_count': fields.Integer(description='The number of items in those wishlists'),
+    'total_quantity': fields.Integer(description='The sum of the quantities of those items'),
+    'last_modified': fields.DateTime(description='When one of the wishlists or their items last changed'),
+})
+
+# Compiled from the models above, used in place of marshal_with
+serialize_item = compile_serializer(item_model)
+serialize_wishlist = compile_serializer(wishlist_model)
+serialize_batch_result = compile_serializer(batch_result_model, skip_none=True)
+serialize_search_hit = compile_serializer(search_hit_model)
+serialize_owner_summary = compile_serializer(owner_summary_model)
+
+# Returned in place of wishlist_items with embed=count
+item_count_field = fields.Integer(readOnly=True, description='The number of items in the wishlist')
+
+# Encode every JSON response with the fast encoder
+api.representation('application/json')(output_json)
+
 # Query string arguments
-wishlist_args = reqparse.RequestParser()
+projection_args = reqparse.RequestParser()
+projection_args.add_argument('fields', type=str, location='args', required=False,
+                             help='Comma separated Wishlist fields to return: ' + ', '.join(Wishlist.PROJECTABLE_FIELDS))
+projection_args.add_argument('embed', type=str, location='args', required=False, choices=Wishlist.EMBED_OPTIONS,
+                             help='Return the items (default), nothing, or an item_count')
+wishlist_args = projection_args.copy()
 wishlist_args.add_argument('name', type=str, location='args', required=False, help='List Wishlists by name')
 wishlist_args.add_argument('owner_id', type=int, location='args', required=False, help='List Wishlists by Owner ID')
+wishlist_args.add_argument('limit', type=int, location='args', required=False,
+                           help='Maximum number of Wishlists to return (capped by the server)')
+wishlist_args.add_argument('after', type=int, location='args', required=False,
+                           help='Cursor: only return Wishlists with an id greater than this')
+export_args = reqparse.RequestParser()
+export_args.add_argument('chunk_size', type=int, location='args', required=False,
+                         help='Number of Wishlists read from the database at a time')
+search_args = reqparse.RequestParser()
+search_args.add_argument('q', type=str, location='args', required=True, help='The words to search for')
+search_args.add_argument('owner_id', type=int, location='args', required=False,
+                         help='Only search the Wishlists of this owner')
+search_args.add_argument('limit', type=int, location='args', required=False,
+                         help='Maximum number of hits to return (capped by the server)')
+search_args.add_argument('offset', type=int, location='args', required=False, default=0,
+                         help='Number of hits to skip')
 wishlist_item_args = reqparse.RequestParser()
 wishlist_item_args.add_argument('name', type=str, location='args', required=False,
-                                help='List Wishlist Items by product name')
+                                help='List Wishlist Items by product name, ignoring case')
+wishlist_item_args.add_argument('match', type=str, location='args', required=False, choices=('exact', 'prefix'),
+                                help='Match the whole product name (default) or its start')
+wishlist_item_args.add_argument('limit', type=int, location='args', required=False,
+                                help='Maximum number of Items to return (capped by the server)')
+wishlist_item_args.add_argument('after', type=int, location='args', required=False,
+                                help='Cursor: only return Items with an id greater than this')
 
 
 ######################################################################
@@ -61,19 +131,39 @@ wishlist_item_args.add_argument('name', type=str, location='args', required=Fals
 ######################################################################
 
 
-@app.route("/health")
+@blueprint.route("/health")
 def health():
     """Let them know our heart is still beating"""
     return jsonify(status=200, message="Healthy"), status.HTTP_200_OK
 
 
+######################################################################
+# GET CACHE STATISTICS
+######################################################################
+@blueprint.route("/admin/cache")
+@admin_only
+def cache_stats():
+    """Returns the hit/miss/eviction counters of the Wishlist cache"""
+    return jsonify(get_cache().stats()), status.HTTP_200_OK
+
+
+######################################################################
+# GET DATABASE POOL STATISTICS
+######################################################################
+@blueprint.route("/admin/db-pool")
+@admin_only
+def db_pool_stats():
+    """Returns the state and checkout/wait counters of the connection pool"""
+    return jsonify(pool_stats(db.engine)), status.HTTP_200_OK
+
+
 ######################################################################
 # GET INDEX
 ######################################################################
-@app.route("/")
+@blueprint.route("/")
 def index():
     """Base URL for our service"""
-    return app.send_static_file("index.html")
+    return current_app.send_static_file("index.html")
 
 ######################################################################
 #  R E S T   A P I   E N D P O I N T S
@@ -93,21 +183,32 @@ class WishlistResource(Resource):
     # RETRIEVE A WISHLIST
     # ------------------------------------------------------------------
     @api.doc("get_wishlist")
+    @api.expect(projection_args, validate=True)
+    @api.response(304, "Wishlist not modified.")
     @api.response(404, "Wishlist not found.")
-    @api.marshal_list_with(wishlist_model)
+    @api.response(200, "Success", wishlist_model)
     def get(self, wishlist_id):
         """
         Retrieves a Wishlist.
         This endpoint will return a wishlist based on its ID.
         """
 
-        app.logger.info("Request to get wishlist with id %s", wishlist_id)
+        current_app.logger.info("Request to get wishlist with id %s", wishlist_id)
+        field_names, embed = projection(projection_args.parse_args())
 
-        wishlist = Wishlist.find(wishlist_id)
+        not_modified = not_modified_response(wishlist_id)
+        if not_modified:
+            return not_modified
+        if field_names is None and embed == "items":
+            wishlist = Wishlist.find_serialized(wishlist_id)
+        else:
+            query = Wishlist.query.filter(Wishlist.id == wishlist_id)
+            wishlist = next(iter(Wishlist.find_projected(field_names, embed, query=query)), None)
 
         if not wishlist:
             abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
-        return wishlist.serialize(), status.HTTP_200_OK
+        serialize = projected_serializer(field_names, embed)
+        return serialize(wishlist), status.HTTP_200_OK, etag_header(wishlist_id, wishlist["version"])
 
     # ------------------------------------------------------------------
     # UPDATE AN EXISTING WISHLIST
@@ -115,24 +216,26 @@ class WishlistResource(Resource):
     @api.doc("update_wishlists")
     @api.response(404, "Wishlist not found")
     @api.response(400, "The posted Wishlist data was not valid")
+    @api.response(412, "The Wishlist was changed since it was read (If-Match)")
     @api.expect(wishlist_model)
-    @api.marshal_with(wishlist_model)
+    @api.response(200, "Success", wishlist_model)
     def put(self, wishlist_id):
         """
         Updates a Wishlist.
         This endpoint will update a Wishlist based the body that is posted.
         """
-        app.logger.info("Request to update wishlist %s", wishlist_id)
+        current_app.logger.info("Request to update wishlist %s", wishlist_id)
         wishlist = Wishlist.find(wishlist_id)
 
         if not wishlist:
             abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
-        app.logger.debug('Payload = %s', api.payload)
+        expected_version = check_if_match(wishlist)
+        current_app.logger.debug('Payload = %s', api.payload)
         data = api.payload
         wishlist.deserialize(data)
         wishlist.id = wishlist_id
-        wishlist.update()
-        return wishlist.serialize(), status.HTTP_200_OK
+        wishlist.update(expected_version)
+        return serialize_wishlist(wishlist.serialize()), status.HTTP_200_OK, etag_header(wishlist_id, wishlist.version)
 
     # ------------------------------------------------------------------
     # DELETE A WISHLIST
@@ -144,12 +247,12 @@ class WishlistResource(Resource):
         Deletes a Wishlist.
         This endpoint will delete a wishlist based on the ID specified in the path.
         """
-        app.logger.info("Request to delete wishlist with id: %s", wishlist_id)
+        current_app.logger.info("Request to delete wishlist with id: %s", wishlist_id)
         wishlist = Wishlist.find(wishlist_id)
 
         if wishlist:
             wishlist.delete()
-            app.logger.info('Wishlist with ID [%s] delete complete.', wishlist_id)
+            current_app.logger.info('Wishlist with ID [%s] delete complete.', wishlist_id)
         return '', status.HTTP_204_NO_CONTENT
 
 ######################################################################
@@ -165,28 +268,36 @@ class WishlistCollection(Resource):
     # ------------------------------------------------------------------
     @api.doc('list_wishlists')
     @api.expect(wishlist_args, validate=True)
-    @api.marshal_list_with(wishlist_model)
+    @api.response(200, 'Success', [wishlist_model])
     def get(self):
         """
         Lists all Wishlists.
         This endpoint will list all available Wishlists.
         """
-        app.logger.info('Request to list Wishlists...')
-        wishlists = []
+        current_app.logger.info('Request to list Wishlists...')
+        query = None
         args = wishlist_args.parse_args()
         if args['owner_id']:
-            app.logger.info('Filtering by owner id: %s', args['owner_id'])
-            wishlists = Wishlist.find_by_owner_id(args['owner_id'])
+            current_app.logger.info('Filtering by owner id: %s', args['owner_id'])
+            query = Wishlist.find_by_owner_id(args['owner_id'])
         elif args['name']:
-            app.logger.info('Filtering by product id: %s', args['name'])
-            wishlists = Wishlist.find_by_name(args['name'])
+            current_app.logger.info('Filtering by product id: %s', args['name'])
+            query = Wishlist.find_by_name(args['name'])
         else:
-            app.logger.info('Returning unfiltered list...')
-            wishlists = Wishlist.all()
+            current_app.logger.info('Returning unfiltered list...')
 
-        results = [wishlist.serialize() for wishlist in wishlists]
-        app.logger.info('[%s] WishlistS returned', len(results))
-        return results, status.HTTP_200_OK
+        limit = page_limit(args['limit'])
+        field_names, embed = projection(args)
+        # fetch one extra row to find out if there is a next page
+        wishlists = Wishlist.find_projected(field_names, embed, limit=limit + 1, after=args['after'], query=query)
+        headers = {}
+        if len(wishlists) > limit:
+            wishlists = wishlists[:limit]
+            headers["Link"] = next_page_link(WishlistCollection, args, limit, wishlists[-1]["id"])
+
+        results = projected_serializer(field_names, embed)(wishlists)
+        current_app.logger.info('[%s] WishlistS returned', len(results))
+        return results, status.HTTP_200_OK, headers
 
     # ------------------------------------------------------------------
     # ADD A NEW WISHLIST
@@ -194,19 +305,46 @@ class WishlistCollection(Resource):
     @api.doc('create_wishlists')
     @api.response(400, 'The posted data was not valid')
     @api.expect(create_wishlist_model)
-    @api.marshal_with(wishlist_model, code=201)
+    @api.response(201, 'Wishlist created', wishlist_model)
     def post(self):
         """
         Creates a Wishlist.
         This endpoint will create a Wishlist based on the data in the body that is posted.
         """
-        app.logger.info('Request to Create a Wishlist')
+        current_app.logger.info('Request to Create a Wishlist')
         wishlist = Wishlist()
         wishlist.deserialize(api.payload)
         wishlist.create()
         location_url = api.url_for(WishlistResource, wishlist_id=wishlist.id, _external=True)
-        app.logger.info('Wishlist with ID [%s] created.', wishlist.id)
-        return wishlist.serialize(), status.HTTP_201_CREATED, {"Location": location_url}
+        current_app.logger.info('Wishlist with ID [%s] created.', wishlist.id)
+        return serialize_wishlist(wishlist.serialize()), status.HTTP_201_CREATED, {"Location": location_url}
+
+######################################################################
+#  PATH: /wishlists:export
+######################################################################
+
+
+@api.route('/wishlists:export', strict_slashes=False)
+class WishlistExport(Resource):
+    """ Streams every Wishlist and its Items """
+
+    @api.doc('export_wishlists')
+    @api.expect(export_args, validate=True)
+    @api.produces(['application/x-ndjson'])
+    def get(self):
+        """
+        Exports all Wishlists.
+        This endpoint streams every Wishlist with its Items as newline delimited JSON.
+        """
+        current_app.logger.info('Request to export Wishlists')
+        args = export_args.parse_args()
+        chunk_size = page_limit(args['chunk_size'])
+        chunks = Wishlist.export_chunks(chunk_size)
+        return Response(
+            stream_with_context(dumps_lines(chunk) for chunk in chunks),
+            status=status.HTTP_200_OK,
+            mimetype="application/x-ndjson",
+        )
 
 ######################################################################
 #  PATH: /wishlists/{wishlist_id}/clear
@@ -220,24 +358,20 @@ class ClearWishlistResource(Resource):
 
     @api.doc("clear_wishlist")
     @api.response(204, "Wishlist Cleared.")
-    @api.marshal_list_with(wishlist_model)
     def put(self, wishlist_id):
         """
         Clears a Wishlist of all its Items.
         This endpoint will remove all items in a Wishlist and make it unavailable.
         """
-        app.logger.info("Request to clear wishlist %s", wishlist_id)
+        current_app.logger.info("Request to clear wishlist %s", wishlist_id)
         wishlist = Wishlist.find(wishlist_id)
 
         if not wishlist:
             abort(status.HTTP_404_NOT_FOUND, f'Wishlist with id {wishlist_id} was not found.')
 
-        while wishlist.wishlist_items:
-            item = wishlist.wishlist_items[0]
-            wishlist.wishlist_items.remove(item)
-            item.delete()
+        count = wishlist.clear_items()
 
-        app.logger.info(f"Wishlist {wishlist_id} cleared.")
+        current_app.logger.info("Wishlist %s cleared of %d items.", wishlist_id, count)
         return "", status.HTTP_204_NO_CONTENT
 
 ######################################################################
@@ -266,29 +400,33 @@ class ItemResource(Resource):
     # RETRIEVE A WISHLIST ITEM
     # ------------------------------------------------------------------
     @api.doc("get_wishlist_items")
+    @api.response(304, "Wishlist Item not modified")
     @api.response(404, "Wishlist Item not found")
-    @api.marshal_with(item_model)
+    @api.response(200, "Success", item_model)
     def get(self, wishlist_id, item_id):
         """
         Retrieves an Item from a Wishlist.
         This endpoint will return a wishlist item based on its ID.
         """
-        app.logger.info('Request to retrieve an Item %s from Wishlist with id: %s', item_id, wishlist_id)
+        current_app.logger.info('Request to retrieve an Item %s from Wishlist with id: %s', item_id, wishlist_id)
 
-        wishlist = Wishlist.find(wishlist_id)
+        not_modified = not_modified_response(wishlist_id)
+        if not_modified:
+            return not_modified
+        wishlist = Wishlist.find_serialized(wishlist_id)
         if not wishlist:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"Wishlist with id '{wishlist_id}' was not found.",
             )
-        item = Item.find_by_wishlist_and_item_id(wishlist_id, item_id)
+        item = next((item for item in wishlist["wishlist_items"] if item["id"] == item_id), None)
         if not item:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"Item with id '{item_id}' was not found.",
             )
-        app.logger.info('Returning wishlist item: %s', item.product_name)
-        return item.serialize(), status.HTTP_200_OK
+        current_app.logger.info('Returning wishlist item: %s', item["product_name"])
+        return serialize_item(item), status.HTTP_200_OK, etag_header(wishlist_id, wishlist["version"])
 
     # ------------------------------------------------------------------
     # DELETE A WISHLIST ITEM
@@ -301,14 +439,13 @@ class ItemResource(Resource):
         This endpoint will delete a Wishlist Item based on the ID specified in the path.
         """
 
-        app.logger.info('Request to delete item with wishlist_id [%s] and item_id [%s] ...', item_id, wishlist_id)
-        wishlist = Wishlist.find(wishlist_id)
+        current_app.logger.info('Request to delete item with wishlist_id [%s] and item_id [%s] ...', wishlist_id, item_id)
+        wishlist, item = Item.find_with_wishlist(wishlist_id, item_id)
         if not wishlist:
             abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
-        item = Item.find(item_id)
         if item:
             item.delete()
-            app.logger.info('Item with ID [%s] and wishlist ID [%s] is deleted.', item_id, wishlist_id)
+            current_app.logger.info('Item with ID [%s] and wishlist ID [%s] is deleted.', item_id, wishlist_id)
 
         return "", status.HTTP_204_NO_CONTENT
 
@@ -318,33 +455,32 @@ class ItemResource(Resource):
     @api.doc("update_item")
     @api.response(404, 'Wishlist not found')
     @api.response(400, 'The posted Wishlist data was not valid')
+    @api.response(412, 'The Wishlist was changed since it was read (If-Match)')
     @api.expect(item_model)
-    @api.marshal_with(item_model)
+    @api.response(200, 'Success', item_model)
     def put(self, wishlist_id, item_id):
         """
         Updates an Item in a Wishlist.
         This endpoint will update a Wishlist Item based on the body that is posted.
         """
 
-        app.logger.info("Request to update product %d in wishlist %d", wishlist_id, item_id)
-        wishlist = Wishlist.find(wishlist_id)
+        current_app.logger.info("Request to update product %d in wishlist %d", item_id, wishlist_id)
+        wishlist, wishlist_products = Item.find_with_wishlist(wishlist_id, item_id)
 
         if not wishlist:
             abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
-
-        wishlist_products = Item.find_by_wishlist_and_item_id(wishlist_id, item_id)
-
         if not wishlist_products:
             abort(status.HTTP_404_NOT_FOUND, f"Item with id '{item_id}' was not found.")
+        expected_version = check_if_match(wishlist)
 
         data = api.payload
         wishlist_products.deserialize(data)
         wishlist_products.id = item_id
         wishlist_products.wishlist_id = wishlist_id
-        wishlist_products.update()
+        wishlist_products.update(expected_version)
 
-        app.logger.info('Item with wishlist_id [%s] and item_id [%s] updated.', wishlist.id, wishlist_products.id)
-        return wishlist_products.serialize(), status.HTTP_200_OK
+        current_app.logger.info('Item with wishlist_id [%s] and item_id [%s] updated.', wishlist.id, wishlist_products.id)
+        return serialize_item(wishlist_products.serialize()), status.HTTP_200_OK, etag_header(wishlist_id, wishlist.version)
 
 
 ######################################################################
@@ -363,28 +499,40 @@ class ItemCollection(Resource):
     # ------------------------------------------------------------------
     @api.doc('list_wishlist_items')
     @api.expect(wishlist_item_args, validate=True)
+    @api.response(304, "Wishlist Items not modified.")
     @api.response(404, "No wishlist found.")
-    @api.marshal_list_with(item_model)
+    @api.response(200, "Success", [item_model])
     def get(self, wishlist_id):
         """
         Lists all Items in a Wishlist.
         This endpoint lists all Items in a Wishlist.
         """
-        app.logger.info('Request to list Items for Wishlist with id: %s', wishlist_id)
-        wishlist = Wishlist.find(wishlist_id)
-        if not wishlist:
+        current_app.logger.info('Request to list Items for Wishlist with id: %s', wishlist_id)
+        version = Wishlist.find_version(wishlist_id)
+        if version is None:
             abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
 
         args = wishlist_item_args.parse_args()
-        app.logger.info('Request to product_name %s for Wishlist with id: %s', args['name'], wishlist_id)
+        current_app.logger.info('Request to product_name %s for Wishlist with id: %s', args['name'], wishlist_id)
         if args['name']:
-            items = Item.find_by_name(args['name'])
+            query = Item.find_by_wishlist_and_name(wishlist_id, args['name'], prefix=args['match'] == 'prefix')
+            headers = {}
         else:
-            items = Item.find_by_wishlist_id(wishlist_id)
-
-        results = [item.serialize() for item in items]
-        app.logger.info("Returning %d items", len(results))
-        return results, status.HTTP_200_OK
+            headers = etag_header(wishlist_id, version)
+            if request.if_none_match.contains_weak(wishlist_etag(wishlist_id, version)):
+                return "", status.HTTP_304_NOT_MODIFIED, headers
+            query = Item.find_by_wishlist_id(wishlist_id)
+
+        limit = page_limit(args['limit'])
+        # fetch one extra row to find out if there is a next page
+        items = Item.find_page(limit + 1, after=args['after'], query=query)
+        if len(items) > limit:
+            items = items[:limit]
+            headers["Link"] = next_page_link(ItemCollection, args, limit, items[-1].id, wishlist_id=wishlist_id)
+
+        results = [serialize_item(item.serialize()) for item in items]
+        current_app.logger.info("Returning %d items", len(results))
+        return results, status.HTTP_200_OK, headers
 
     # ------------------------------------------------------------------
     # ADD A NEW ITEM TO A WISHLIST
@@ -392,15 +540,14 @@ class ItemCollection(Resource):
     @api.doc('create_wishlist_items')
     @api.response(400, 'The posted data was not valid')
     @api.expect(create_item_model)
-    @api.marshal_with(item_model, code=201)
+    @api.response(201, 'Item created', item_model)
     def post(self, wishlist_id):
         """
         Create an Item in a Wishlist.
         This endpoint will add a new item to a wishlist.
         """
-        app.logger.info('Request to create an Item for Wishlist with id: %s', wishlist_id)
-        wishlist = Wishlist.find(wishlist_id)
-        if not wishlist:
+        current_app.logger.info('Request to create an Item for Wishlist with id: %s', wishlist_id)
+        if Wishlist.find_version(wishlist_id, cached=False) is None:
             abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
 
         item = Item()
@@ -408,9 +555,132 @@ class ItemCollection(Resource):
         item.wishlist_id = wishlist_id
         item.create()
 
-        location_url = api.url_for(ItemResource, wishlist_id=wishlist.id, item_id=item.id, _external=True)
-        app.logger.info('Item with ID [%s] created for wishlist: [%s].', item.id, wishlist.id)
-        return item.serialize(), status.HTTP_201_CREATED, {"Location": location_url}
+        location_url = api.url_for(ItemResource, wishlist_id=wishlist_id, item_id=item.id, _external=True)
+        current_app.logger.info('Item with ID [%s] created for wishlist: [%s].', item.id, wishlist_id)
+        return serialize_item(item.serialize()), status.HTTP_201_CREATED, {"Location": location_url}
+
+
+######################################################################
+#  PATH: /wishlists/{wishlist_id}/items:batch
+######################################################################
+
+
+@api.route('/wishlists/<int:wishlist_id>/items:batch', strict_slashes=False)
+@api.param('wishlist_id', 'The Wishlist identifier')
+class ItemBatchCollection(Resource):
+    """
+    Handles adding many Items to a Wishlist at once
+    """
+    # ------------------------------------------------------------------
+    # ADD MANY ITEMS TO A WISHLIST
+    # ------------------------------------------------------------------
+    @api.doc('create_wishlist_items_batch')
+    @api.response(400, 'The posted data was not valid')
+    @api.response(404, 'Wishlist not found')
+    @api.response(413, 'Too many items in the batch')
+    @api.expect([create_item_model])
+    @api.response(201, 'Items created', [batch_result_model])
+    def post(self, wishlist_id):
+        """
+        Create many Items in a Wishlist.
+        This endpoint validates every posted item and adds them all in one transaction.
+        If any item is invalid nothing is added and the rejected rows are returned.
+        """
+        current_app.logger.info('Request to create a batch of Items for Wishlist with id: %s', wishlist_id)
+        if Wishlist.find_version(wishlist_id, cached=False) is None:
+            abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
+
+        rows = api.payload
+        if not isinstance(rows, list):
+            abort(status.HTTP_400_BAD_REQUEST, "Batch body must be a JSON array of items.")
+        if len(rows) > current_app.config["ITEM_BATCH_MAX"]:
+            abort(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                  f"Batch of {len(rows)} items exceeds the limit of {current_app.config['ITEM_BATCH_MAX']}.")
+
+        items = []
+        errors = []
+        for position, row in enumerate(rows):
+            try:
+                item = Item().deserialize(row)
+            except DataValidationError as error:
+                errors.append({"index": position, "status": status.HTTP_400_BAD_REQUEST, "error": str(error)})
+                continue
+            item.wishlist_id = wishlist_id
+            items.append(item)
+        if errors:
+            current_app.logger.error('Rejected batch for wishlist [%s]: %d invalid items', wishlist_id, len(errors))
+            return serialize_batch_result(errors), status.HTTP_400_BAD_REQUEST
+
+        created = Item.create_many(items)
+        current_app.logger.info('%d Items created for wishlist: [%s].', len(items), wishlist_id)
+        results = [
+            {"index": position, "status": status.HTTP_201_CREATED, "item": item}
+            for position, item in enumerate(created)
+        ]
+        return serialize_batch_result(results), status.HTTP_201_CREATED
+
+
+######################################################################
+#  PATH: /search
+######################################################################
+
+
+@api.route('/search', strict_slashes=False)
+class SearchCollection(Resource):
+    """ Full-text search over Wishlist and product names """
+
+    @api.doc('search')
+    @api.expect(search_args, validate=True)
+    @api.response(400, 'The query was missing or not valid')
+    @api.response(200, 'Success', [search_hit_model])
+    def get(self):
+        """
+        Searches Wishlists and Items.
+        This endpoint returns the Wishlists and Items whose names contain every word of q, best match first.
+        """
+        args = search_args.parse_args()
+        current_app.logger.info('Request to search for %r', args['q'])
+        if not search.tokenize(args['q']):
+            abort(status.HTTP_400_BAD_REQUEST, "The search query must contain at least one word.")
+        if args['offset'] < 0:
+            abort(status.HTTP_400_BAD_REQUEST, f"Invalid offset '{args['offset']}': must not be negative.")
+        limit = page_limit(args['limit'])
+        # fetch one extra hit to find out if there is a next page
+        hits = search.search(args['q'], owner_id=args['owner_id'], limit=limit + 1, offset=args['offset'])
+        headers = {}
+        if len(hits) > limit:
+            hits = hits[:limit]
+            params = {key: value for key, value in args.items() if value is not None}
+            params.update(limit=limit, offset=args['offset'] + limit)
+            headers["Link"] = f'<{api.url_for(SearchCollection, _external=True, **params)}>; rel="next"'
+        current_app.logger.info('Returning %d search hits', len(hits))
+        return serialize_search_hit(hits), status.HTTP_200_OK, headers
+
+
+######################################################################
+#  PATH: /owners/{owner_id}/summary
+######################################################################
+
+
+@api.route('/owners/<int:owner_id>/summary', strict_slashes=False)
+@api.param('owner_id', 'The owner identifier')
+class OwnerSummaryResource(Resource):
+    """ Totals over all of the Wishlists of an owner """
+
+    @api.doc('get_owner_summary')
+    @api.response(200, 'Success', owner_summary_model)
+    def get(self, owner_id):
+        """
+        Summarizes the Wishlists of an owner.
+        This endpoint returns how many wishlists and items an owner has, the total item quantity and when they last
+        changed, without returning the wishlists themselves. An owner without wishlists gets zero counts.
+        """
+        current_app.logger.info('Request for the summary of owner %s', owner_id)
+        summary = Wishlist.summarize_owner(owner_id)
+        headers = {}
+        if summary['last_modified'] is not None:
+            headers['Last-Modified'] = http_date(summary['last_modified'].astimezone())
+        return serialize_owner_summary(summary), status.HTTP_200_OK, headers
 
 
 ######################################################################
@@ -419,5 +689,99 @@ class ItemCollection(Resource):
 
 def abort(error_code: int, message: str):
     """Logs errors before aborting"""
-    app.logger.error(message)
+    current_app.logger.error(message)
     api.abort(error_code, message)
+
+
+def wishlist_etag(wishlist_id, version):
+    """Returns the (unquoted) strong ETag of a Wishlist at the given version"""
+    return f"{wishlist_id}-{version}"
+
+
+def etag_header(wishlist_id, version):
+    """Returns the ETag response header for a Wishlist at the given version"""
+    return {"ETag": quote_etag(wishlist_etag(wishlist_id, version))}
+
+
+def not_modified_response(wishlist_id):
+    """Answers a conditional GET from the Wishlist version alone
+
+    Returns a 304 response if the If-None-Match header matches the current
+    version of the Wishlist, without loading any of its Items. Returns None
+    if the request is not conditional or the client copy is out of date.
+    """
+    if not request.if_none_match:
+        return None
+    version = Wishlist.find_version(wishlist_id)
+    if version is None:
+        abort(status.HTTP_404_NOT_FOUND, f"Wishlist with id '{wishlist_id}' was not found.")
+    if request.if_none_match.contains_weak(wishlist_etag(wishlist_id, version)):
+        return "", status.HTTP_304_NOT_MODIFIED, etag_header(wishlist_id, version)
+    return None
+
+
+def check_if_match(wishlist):
+    """Aborts with 412 when an If-Match precondition on the Wishlist fails
+
+    Returns:
+        the version the write has to find the Wishlist at, or None when
+        the request has no If-Match precondition on a version
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    if not request.if_match.contains(wishlist_etag(wishlist.id, wishlist.version)):
+        abort(status.HTTP_412_PRECONDITION_FAILED,
+              f"Wishlist with id '{wishlist.id}' has been modified since it was read.")
+    return wishlist.version
+
+
+def projection(args):
+    """Returns the validated field names and embed option of a read request
+
+    The field names are None when the client did not ask for a subset.
+    """
+    embed = args['embed'] or "items"
+    if args['fields'] is None:
+        return None, embed
+    names = tuple(dict.fromkeys(name.strip() for name in args['fields'].split(",") if name.strip()))
+    unknown = [name for name in names if name not in Wishlist.PROJECTABLE_FIELDS]
+    if unknown or not names:
+        abort(status.HTTP_400_BAD_REQUEST,
+              f"Invalid fields '{args['fields']}': choose from {', '.join(Wishlist.PROJECTABLE_FIELDS)}.")
+    return names, embed
+
+
+@lru_cache(maxsize=None)
+def projected_serializer(field_names, embed):
+    """Returns the compiled serializer for a field subset and embed option"""
+    if field_names is None and embed == "items":
+        return serialize_wishlist
+    model = {
+        name: field for name, field in wishlist_model.resolved.items()
+        if name in (field_names or Wishlist.PROJECTABLE_FIELDS)
+    }
+    if embed == "items":
+        model["wishlist_items"] = wishlist_model.resolved["wishlist_items"]
+    elif embed == "count":
+        model["item_count"] = item_count_field
+    return compile_serializer(model)
+
+
+def page_limit(limit):
+    """Returns the requested page size capped to the server maximum"""
+    if limit is None:
+        limit = current_app.config["PAGE_SIZE_DEFAULT"]
+    if limit < 1:
+        abort(status.HTTP_400_BAD_REQUEST, f"Invalid limit '{limit}': must be a positive integer.")
+    return min(limit, current_app.config["PAGE_SIZE_MAX"])
+
+
+def next_page_link(resource, args, limit, cursor, **path):
+    """Builds an RFC 8288 Link header pointing at the next page
+
+    The path parameters of the resource, if any, are passed as keywords.
+    """
+    params = {key: value for key, value in args.items() if value is not None}
+    params.update(path, limit=limit, after=cursor)
+    url = api.url_for(resource, _external=True, **params)
+    return f'<{url}>; rel="next"'
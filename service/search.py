@@ -0,0 +1,169 @@
+"""
+Full-Text Search
+
+Searches wishlist names and product names. Every hit is either a
+Wishlist or an Item, ranked by how well its name matches the query.
+
+On PostgreSQL the search runs in the database against the GIN indexes
+of the name tsvectors (see SEARCH_INDEXES in service.models). Other
+databases, such as the SQLite used by the tests and local development,
+are searched through an in-memory inverted index. Each process keeps its
+own and rebuilds it after it committed a change to the wishlist or item
+table, so the fallback is meant for a single process, not for production.
+"""
+import re
+import logging
+import threading
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from service.models import db, Wishlist, Item, SEARCH_VECTORS
+
+logger = logging.getLogger("flask.app")
+
+# PostgreSQL text search configuration: no stemming, product names are not English
+TEXT_SEARCH_CONFIG = "simple"
+
+SEARCH_SQL = """
+SELECT 'wishlist' AS type, wishlist.id AS id, wishlist.id AS wishlist_id, wishlist.owner_id AS owner_id,
+       wishlist.name AS name, ts_rank({wishlist_vector}, query) AS rank
+FROM wishlist, plainto_tsquery(:config, :q) AS query
+WHERE {wishlist_vector} @@ query {owner_filter}
+UNION ALL
+SELECT 'item', item.id, item.wishlist_id, wishlist.owner_id, item.product_name, ts_rank({item_vector}, query)
+FROM item JOIN wishlist ON wishlist.id = item.wishlist_id, plainto_tsquery(:config, :q) AS query
+WHERE {item_vector} @@ query {owner_filter}
+ORDER BY rank DESC, type DESC, id
+LIMIT :limit OFFSET :offset
+"""
+
+
+def search(q, owner_id=None, limit=100, offset=0):
+    """Returns the ranked hits for a query, best match first
+
+    Args:
+        q (str): the words to search for; every word has to match
+        owner_id (int): only search the Wishlists of this owner
+        limit (int): the maximum number of hits to return
+        offset (int): the number of hits to skip
+
+    Returns:
+        a list of dictionaries with type ("wishlist" or "item"), id,
+        wishlist_id, owner_id, name and rank
+    """
+    logger.info("Processing search for %r (owner %s, limit %s, offset %s) ...", q, owner_id, limit, offset)
+    if db.engine.dialect.name == "postgresql":
+        owner_filter = "AND wishlist.owner_id = :owner_id" if owner_id is not None else ""
+        rows = db.session.execute(
+            text(SEARCH_SQL.format(owner_filter=owner_filter, wishlist_vector=SEARCH_VECTORS["wishlist"],
+                                   item_vector=SEARCH_VECTORS["item"])),
+            {"config": TEXT_SEARCH_CONFIG, "q": q, "owner_id": owner_id, "limit": limit, "offset": offset},
+        ).mappings()
+        return [dict(row, rank=round(row["rank"], 6)) for row in rows]
+    return get_fallback_index().search(q, owner_id)[offset:offset + limit]
+
+
+def tokenize(value):
+    """Splits a name into lower case words"""
+    return re.findall(r"\w+", value.lower())
+
+
+class InvertedIndex:
+    """An in-memory inverted index over wishlist and product names"""
+
+    def __init__(self, documents=()):
+        self.documents = []
+        self.lengths = []
+        self.postings = defaultdict(dict)  # word -> {document number: occurrences}
+        for document in documents:
+            self.add(document)
+
+    def add(self, document):
+        """Adds a hit dictionary; its name is the text that is indexed"""
+        number = len(self.documents)
+        words = tokenize(document["name"])
+        self.documents.append(document)
+        self.lengths.append(len(words) or 1)
+        for word in words:
+            self.postings[word][number] = self.postings[word].get(number, 0) + 1
+
+    def search(self, q, owner_id=None):
+        """Returns the documents that contain every word of q, best match first
+
+        The rank is the share of the document's words that match the
+        query, so short names that match closely rank first.
+        """
+        words = set(tokenize(q))
+        if not words:
+            return []
+        matches = set.intersection(*(set(self.postings.get(word, ())) for word in words))
+        hits = []
+        for number in matches:
+            document = self.documents[number]
+            if owner_id is not None and document["owner_id"] != owner_id:
+                continue
+            occurrences = sum(self.postings[word][number] for word in words)
+            hits.append(dict(document, rank=round(occurrences / self.lengths[number], 6)))
+        hits.sort(key=lambda hit: (-hit["rank"], hit["type"] != "wishlist", hit["id"]))
+        return hits
+
+
+######################################################################
+#  F A L L B A C K   I N D E X   M A I N T E N A N C E
+######################################################################
+
+# the tables the index is built from
+SEARCH_TABLES = frozenset({"wishlist", "item"})
+
+_generation_lock = threading.Lock()
+_generation = [0]  # bumped on every commit that changed one of SEARCH_TABLES
+
+
+def _track_writes(conn, _cursor, _statement, _parameters, context, _executemany):
+    if not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    table = getattr(context.compiled.statement, "table", None)
+    if table is not None and table.name in SEARCH_TABLES:
+        conn.info["search_tables_changed"] = True
+
+
+def _data_changed(conn):
+    if conn.info.pop("search_tables_changed", False):
+        with _generation_lock:
+            _generation[0] += 1
+
+
+def _data_rolled_back(conn):
+    conn.info.pop("search_tables_changed", None)
+
+
+def get_fallback_index():
+    """Returns the inverted index of the current app, rebuilt if the search tables changed since"""
+    if not event.contains(Engine, "commit", _data_changed):
+        event.listen(Engine, "after_cursor_execute", _track_writes)
+        event.listen(Engine, "commit", _data_changed)
+        event.listen(Engine, "rollback", _data_rolled_back)
+    generation, index = current_app.extensions.get("search_index", (None, None))
+    if generation != _generation[0]:
+        generation = _generation[0]
+        index = build_index()
+        current_app.extensions["search_index"] = (generation, index)
+    return index
+
+
+def build_index():
+    """Reads every Wishlist and Item name into a new InvertedIndex"""
+    logger.info("Building the in-memory search index")
+    wishlists = db.session.query(Wishlist.id, Wishlist.owner_id, Wishlist.name)
+    items = db.session.query(Item.id, Item.wishlist_id, Wishlist.owner_id, Item.product_name).join(Wishlist)
+    documents = [
+        {"type": "wishlist", "id": row.id, "wishlist_id": row.id, "owner_id": row.owner_id, "name": row.name}
+        for row in wishlists
+    ]
+    documents.extend(
+        {"type": "item", "id": row.id, "wishlist_id": row.wishlist_id, "owner_id": row.owner_id,
+         "name": row.product_name}
+        for row in items
+    )
+    return InvertedIndex(documents)
@@ -0,0 +1,89 @@
+"""
+Test cases for the Cache
+
+Test cases can be run with:
+    nosetests
+    coverage report -m
+"""
+from unittest import TestCase
+from service.common.cache import Cache, LRUCache, NullCache, make_cache
+
+
+class FakeClock:  # pylint: disable=too-few-public-methods
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+######################################################################
+#  C A C H E   T E S T   C A S E S
+######################################################################
+class TestLRUCache(TestCase):
+    """Test Cases for the LRU Cache"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LRUCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_get_and_set(self):
+        """It should return cached values and count hits and misses"""
+        self.assertIsNone(self.cache.get(1))
+        self.cache.set(1, "one")
+        self.assertEqual(self.cache.get(1), "one")
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_evicts_least_recently_used(self):
+        """It should evict the least recently used entry when full"""
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+        self.cache.get(1)
+        self.cache.set(3, "three")
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.get(1), "one")
+        self.assertEqual(self.cache.get(3), "three")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_expires_entries(self):
+        """It should treat entries older than the ttl as misses"""
+        self.cache.set(1, "one")
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get(1), "one")
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_delete_and_clear(self):
+        """It should delete single entries and clear the cache"""
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+        self.cache.delete(1)
+        self.cache.delete(42)
+        self.assertIsNone(self.cache.get(1))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(2))
+
+    def test_make_cache(self):
+        """It should make a NullCache when the size is zero"""
+        self.assertIsInstance(make_cache(10, 1), LRUCache)
+        null_cache = make_cache(0, 1)
+        self.assertIsInstance(null_cache, NullCache)
+        null_cache.set(1, "one")
+        self.assertIsNone(null_cache.get(1))
+        self.assertEqual(null_cache.stats()["misses"], 1)
+
+    def test_interface(self):
+        """It should require subclasses to implement the interface"""
+        cache = Cache()
+        self.assertRaises(NotImplementedError, cache.get, 1)
+        self.assertRaises(NotImplementedError, cache.set, 1, "one")
+        self.assertRaises(NotImplementedError, cache.delete, 1)
+        self.assertRaises(NotImplementedError, cache.clear)
+        self.assertRaises(NotImplementedError, cache.stats)
@@ -1,23 +1,60 @@
 """
 CLI Command Extensions for Flask
 """
-import os
+import json
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
-from click.testing import CliRunner
-from service.common.cli_commands import db_create
+from service import create_app
+from service.common.cli_commands import db_create, db_upgrade, wishlists_export, wishlists_import
 
 
 class TestFlaskCLI(TestCase):
     """Test Flask CLI Commands"""
 
     def setUp(self):
-        self.runner = CliRunner()
+        self.runner = create_app().test_cli_runner()
 
     @patch('service.common.cli_commands.db')
     def test_db_create(self, db_mock):
         """It should call the db-create command"""
         db_mock.return_value = MagicMock()
-        with patch.dict(os.environ, {"FLASK_APP": "service:app"}, clear=True):
-            result = self.runner.invoke(db_create)
-            self.assertEqual(result.exit_code, 0)
+        result = self.runner.invoke(db_create)
+        self.assertEqual(result.exit_code, 0)
+
+    @patch('service.common.cli_commands.migrations')
+    def test_db_upgrade(self, migrations_mock):
+        """It should call the db-upgrade command"""
+        migrations_mock.upgrade.return_value = [1]
+        migrations_mock.head_version.return_value = 1
+        result = self.runner.invoke(db_upgrade)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Applied migrations: 1", result.output)
+        migrations_mock.upgrade.assert_called_once()
+
+    @patch('service.common.cli_commands.Wishlist')
+    def test_wishlists_export(self, wishlist_mock):
+        """It should export wishlists as newline delimited JSON"""
+        wishlist_mock.export_chunks.return_value = iter([
+            [{"id": 1, "name": "one", "wishlist_items": []}, {"id": 2, "name": "two", "wishlist_items": []}],
+            [{"id": 3, "name": "three", "wishlist_items": []}],
+        ])
+        result = self.runner.invoke(wishlists_export, ["--chunk-size", "2"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        wishlist_mock.export_chunks.assert_called_once_with(2)
+        lines = [line for line in result.output.splitlines() if line.startswith("{")]
+        self.assertEqual([json.loads(line)["id"] for line in lines], [1, 2, 3])
+
+    @patch('service.common.cli_commands.bulk_import.import_records')
+    def test_wishlists_import(self, import_mock):
+        """It should import a file and report the load rate and rejects"""
+        stats = MagicMock(wishlists=2, items=3, seconds=0.5, rows_per_second=10.0)
+        stats.rejected = [{"line": 4, "error": "Invalid Wishlist: missing name", "record": {}}]
+        import_mock.return_value = stats
+        with self.runner.isolated_filesystem():
+            with open("items.csv", "w", encoding="utf-8") as source:
+                source.write("id,wishlist_id,product_id,item_quantity,product_name\n")
+            result = self.runner.invoke(wishlists_import, ["items.csv", "--kind", "items"], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(import_mock.call_args.kwargs, {"kind": "items", "batch_size": 1000})
+        self.assertIn("Rejected line 4: Invalid Wishlist: missing name", result.output)
+        self.assertIn("Imported 2 wishlists and 3 items in 0.50s (10 rows/sec), rejected 1 records", result.output)
@@ -0,0 +1,115 @@
+"""
+Test cases for the Gunicorn configuration
+
+Test cases can be run with:
+    nosetests
+    coverage report -m
+"""
+import os
+import runpy
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from service import create_app
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+def load_config(**environ):
+    """Returns the settings of gunicorn.conf.py under the given environment"""
+    with patch.dict(os.environ, environ):
+        return runpy.run_path(CONFIG_FILE)
+
+
+######################################################################
+#  G U N I C O R N   C O N F I G   T E S T   C A S E S
+######################################################################
+class TestGunicornConfig(TestCase):
+    """Test Cases for gunicorn.conf.py"""
+
+    def test_sync_workers_by_default(self):
+        """It should run preloaded sync workers sized from the CPUs unless told otherwise"""
+        with patch.dict(os.environ):
+            for name in [name for name in os.environ if name.startswith("GUNICORN_")]:
+                del os.environ[name]
+            config = runpy.run_path(CONFIG_FILE)
+        self.assertEqual(config["worker_class"], "sync")
+        self.assertEqual(config["workers"], 2 * config["available_cpus"]() + 1)
+        self.assertEqual(config["threads"], min(config["available_cpus"](), int(os.getenv("DB_POOL_SIZE", "5"))))
+        self.assertTrue(config["preload_app"])
+        self.assertEqual((config["max_requests"], config["max_requests_jitter"]), (1000, 100))
+
+    def test_gevent_workers(self):
+        """It should select gevent workers and their connection limit from the environment"""
+        config = load_config(GUNICORN_WORKER_CLASS="gevent", GUNICORN_WORKER_CONNECTIONS="250")
+        self.assertEqual(config["worker_class"], "gevent")
+        self.assertEqual(config["worker_connections"], 250)
+        self.assertEqual(config["workers"], config["available_cpus"]())
+        self.assertEqual(config["threads"], 1)
+        self.assertFalse(config["preload_app"])
+
+    def test_environment_overrides(self):
+        """It should take every tuned setting from the environment"""
+        config = load_config(
+            GUNICORN_WORKERS="3", GUNICORN_THREADS="4", GUNICORN_PRELOAD="false", GUNICORN_KEEPALIVE="10",
+            GUNICORN_BACKLOG="64", GUNICORN_MAX_REQUESTS="0", GUNICORN_BIND="127.0.0.1:9000",
+        )
+        self.assertEqual((config["workers"], config["threads"]), (3, 4))
+        self.assertFalse(config["preload_app"])
+        self.assertEqual((config["keepalive"], config["backlog"], config["max_requests"]), (10, 64, 0))
+        self.assertEqual(config["bind"], "127.0.0.1:9000")
+
+    def test_available_cpus_cgroup_v2(self):
+        """It should round a cgroup v2 CPU quota up to whole CPUs"""
+        config = load_config()
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "cpu.max"), "w", encoding="utf-8") as cpu_max:
+                cpu_max.write("20000 100000\n")
+            self.assertEqual(config["available_cpus"](root), 1)
+            with open(os.path.join(root, "cpu.max"), "w", encoding="utf-8") as cpu_max:
+                cpu_max.write("max 100000\n")
+            self.assertEqual(config["available_cpus"](root), config["available_cpus"]("/nonexistent"))
+
+    def test_available_cpus_cgroup_v1(self):
+        """It should read the cgroup v1 CFS quota"""
+        config = load_config()
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "cpu"))
+            for name, value in (("cpu.cfs_quota_us", "150000"), ("cpu.cfs_period_us", "100000")):
+                with open(os.path.join(root, "cpu", name), "w", encoding="utf-8") as cgroup_file:
+                    cgroup_file.write(value)
+            self.assertEqual(config["available_cpus"](root), min(2, config["available_cpus"]("/nonexistent")))
+
+    def test_post_fork_disposes_engine(self):
+        """It should drop the pooled connections inherited from a preloaded master"""
+        config = load_config(GUNICORN_WORKER_CLASS="sync", GUNICORN_PRELOAD="true")
+        worker = SimpleNamespace(app=SimpleNamespace(callable=create_app()))
+        with patch("sqlalchemy.engine.Engine.dispose") as dispose:
+            config["post_fork"](None, worker)
+        dispose.assert_called_with(close=False)
+
+    def test_on_starting_clears_metrics(self):
+        """It should remove metric files left over from an earlier run"""
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            stale = os.path.join(multiproc_dir, "counter_1.db")
+            with open(stale, "w", encoding="utf-8"):
+                pass
+            config = load_config(PROMETHEUS_MULTIPROC_DIR=multiproc_dir)
+            with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": multiproc_dir}):
+                config["on_starting"](None)
+            self.assertFalse(os.path.exists(stale))
+
+    def test_child_exit_drops_live_gauges(self):
+        """It should remove the live gauge files of a worker that exited"""
+        with tempfile.TemporaryDirectory() as multiproc_dir:
+            live = os.path.join(multiproc_dir, "gauge_livesum_123.db")
+            counter = os.path.join(multiproc_dir, "counter_123.db")
+            for path in (live, counter):
+                with open(path, "w", encoding="utf-8"):
+                    pass
+            config = load_config(PROMETHEUS_MULTIPROC_DIR=multiproc_dir)
+            with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": multiproc_dir}):
+                config["child_exit"](None, SimpleNamespace(pid=123))
+            self.assertFalse(os.path.exists(live))
+            self.assertTrue(os.path.exists(counter))
@@ -0,0 +1,107 @@
+"""
+Test cases for the Response Serializers
+
+Test cases can be run with:
+    nosetests
+    coverage report -m
+"""
+import json
+import datetime
+from unittest import TestCase
+from unittest.mock import patch
+from flask_restx import fields, marshal
+from service import create_app
+from service.common import serializers
+from service.common.serializers import compile_serializer, dumps, output_json
+from service.routes import item_model, wishlist_model, batch_result_model
+
+app = create_app()
+
+WISHLIST = {
+    "id": 7,
+    "name": "birthday",
+    "owner_id": 3,
+    "created_at": datetime.datetime(2023, 4, 5, 6, 7, 8),
+    "version": 4,
+    "wishlist_items": [
+        {"id": 1, "wishlist_id": 7, "product_id": 11, "item_quantity": 2, "product_name": "kite"},
+        {"id": 2, "wishlist_id": 7, "product_id": 12, "item_quantity": 1, "product_name": "yoyo"},
+    ],
+}
+
+
+######################################################################
+#  S E R I A L I Z E R   T E S T   C A S E S
+######################################################################
+class TestCompileSerializer(TestCase):
+    """Compiled serializers produce what marshal() produces"""
+
+    def test_wishlist(self):
+        """It should serialize a Wishlist with its Items like marshal"""
+        serialize = compile_serializer(wishlist_model)
+        result = serialize(WISHLIST)
+        self.assertEqual(result, marshal(WISHLIST, wishlist_model))
+        self.assertEqual(list(result), list(marshal(WISHLIST, wishlist_model)))
+        self.assertNotIn("version", result)
+        self.assertEqual(result["created_at"], "2023-04-05")
+
+    def test_list(self):
+        """It should serialize a list of dictionaries"""
+        serialize = compile_serializer(item_model)
+        items = WISHLIST["wishlist_items"]
+        self.assertEqual(serialize(items), marshal(items, item_model))
+
+    def test_missing_and_mistyped_values(self):
+        """It should fill missing keys with None and format mistyped values"""
+        serialize = compile_serializer(wishlist_model)
+        data = {"id": "7", "owner_id": 3.0, "created_at": "2023-04-05T06:07:08", "wishlist_items": None}
+        self.assertEqual(serialize(data), marshal(data, wishlist_model))
+
+    def test_skip_none(self):
+        """It should leave out None values and null nested objects"""
+        serialize = compile_serializer(batch_result_model, skip_none=True)
+        rows = [
+            {"index": 0, "status": 400, "error": "bad"},
+            {"index": 1, "status": 201, "item": WISHLIST["wishlist_items"][0]},
+        ]
+        self.assertEqual(serialize(rows), marshal(rows, batch_result_model, skip_none=True))
+        self.assertEqual(serialize(rows)[0], {"index": 0, "status": 400, "error": "bad"})
+
+    def test_attribute_and_default(self):
+        """It should read renamed attributes and apply defaults"""
+        model = {
+            "label": fields.String(attribute="name"),
+            "count": fields.Integer(default=0),
+            "enabled": fields.Boolean(default=lambda: True),
+            "raw": fields.Raw,
+        }
+        serialize = compile_serializer(model)
+        data = {"name": "x", "raw": [1, 2]}
+        self.assertEqual(serialize(data), {"label": "x", "count": 0, "enabled": True, "raw": [1, 2]})
+        self.assertEqual(serialize(data), dict(marshal(data, model)))
+
+
+######################################################################
+#  J S O N   E N C O D I N G   T E S T   C A S E S
+######################################################################
+class TestJSONEncoding(TestCase):
+    """JSON response encoding"""
+
+    def test_dumps_json(self):
+        """It should encode with the json module when orjson is not used"""
+        with app.app_context(), patch.object(serializers, "orjson", None):
+            body = dumps({"created_at": datetime.date(2023, 1, 2), "ids": [1, 2]})
+        self.assertEqual(body, b'{"created_at":"2023-01-02","ids":[1,2]}\n')
+
+    def test_dumps_orjson_disabled(self):
+        """It should not use orjson when FAST_JSON is off"""
+        with app.app_context(), patch.dict(app.config, {"FAST_JSON": False}):
+            self.assertEqual(json.loads(dumps({"a": 1})), {"a": 1})
+
+    def test_output_json(self):
+        """It should build a response with the encoded body and headers"""
+        with app.test_request_context():
+            response = output_json({"id": 1}, 201, {"Location": "/x"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.headers["Location"], "/x")
+        self.assertEqual(json.loads(response.get_data()), {"id": 1})